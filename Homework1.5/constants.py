@@ -58,4 +58,5 @@ FIRERATE = 10
 DODGERATE = 10
 
 INFINITY = float("inf")
+EPSILON = 0.000001
 
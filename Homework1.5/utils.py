@@ -195,6 +195,64 @@ def minimumDistance(line, point):
 	return distance(point, p3)
 
 
+# Pack lines ((x1, y1), (x2, y2)) into an (N, 4) float array (x1, y1, x2, y2). Arrays are returned as they are.
+def packLines(lines):
+	if isinstance(lines, numpy.ndarray):
+		return lines
+	return numpy.array(lines, dtype = float).reshape(-1, 4)
+
+# Distance from every point to every segment, all at once. Same as minimumDistance(line, point) for each pair.
+# points: list of points or (P, 2) array
+# lines: (N, 4) array of segments (see packLines)
+# Returns a (P, N) array.
+def pointsToLinesDistance(points, lines):
+	points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	px = points[:, 0:1]
+	py = points[:, 1:2]
+	x1 = lines[:, 0]
+	y1 = lines[:, 1]
+	dx = lines[:, 2] - x1
+	dy = lines[:, 3] - y1
+	d2 = dx*dx + dy*dy
+	# Where the projection of the point falls along each segment, clamped to the segment. Zero-length segments are just their first point.
+	t = numpy.clip(((px - x1)*dx + (py - y1)*dy) / numpy.where(d2 == 0.0, 1.0, d2), 0.0, 1.0)
+	return numpy.hypot(px - (x1 + t*dx), py - (y1 + t*dy))
+
+# Which segments in lines, an (N, 4) array, cross the segment p1 to p2? Returns an (N,) boolean array.
+# Each end of a crossing segment is strictly on a different side of p1 to p2, and p1 and p2 are strictly on different sides of it, so touching doesn't count.
+def segmentsCross(p1, p2, lines):
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	dx = p2[0] - p1[0]
+	dy = p2[1] - p1[1]
+	ldx = x2 - x1
+	ldy = y2 - y1
+	sides = (dx*(y1 - p1[1]) - dy*(x1 - p1[0])) * (dx*(y2 - p1[1]) - dy*(x2 - p1[0]))
+	lineSides = (ldx*(p1[1] - y1) - ldy*(p1[0] - x1)) * (ldx*(p2[1] - y1) - ldy*(p2[0] - x1))
+	return (sides < 0) & (lineSides < 0)
+
+# Can a circle of the given radius sweep from p1 to p2 without running into any segment in lines? lines is a list of lines or an (N, 4) array.
+# The circle sweeps out a capsule: everything within radius of the segment p1 to p2. A segment is in the way if it reaches into the capsule.
+# escaping: if True, a segment the circle already overlaps at p1 is only in the way if the sweep goes further into it, so an agent brushing a wall can still move along it or away from it.
+# Otherwise any segment within radius of the sweep is in the way, including one the circle starts on.
+# Segments whose bounding boxes are farther than radius from the bounding box of p1 to p2 are skipped without working out the distance.
+def capsuleClear(p1, p2, radius, lines, escaping = False):
+	lines = packLines(lines)
+	near = (numpy.minimum(lines[:, 0], lines[:, 2]) < max(p1[0], p2[0]) + radius) & (numpy.maximum(lines[:, 0], lines[:, 2]) > min(p1[0], p2[0]) - radius) & (numpy.minimum(lines[:, 1], lines[:, 3]) < max(p1[1], p2[1]) + radius) & (numpy.maximum(lines[:, 1], lines[:, 3]) > min(p1[1], p2[1]) - radius)
+	if not near.any():
+		return True
+	lines = lines[near]
+	# Anything that crosses p1 to p2 is in the way. This rules out most blocked sweeps without working out any distances.
+	if segmentsCross(p1, p2, lines).any():
+		return False
+	# Segments that don't cross are closest at an endpoint of one or the other
+	fromEnds = pointsToLinesDistance([p1, p2], lines)
+	toEnds = pointsToLinesDistance(lines.reshape(-1, 2), numpy.array([[p1[0], p1[1], p2[0], p2[1]]], dtype = float)).reshape(-1, 2)
+	d = numpy.minimum(fromEnds.min(axis = 0), toEnds.min(axis = 1))
+	if not escaping:
+		return not (d < radius).any()
+	start = fromEnds[0]
+	return not ((d < radius) & ((start >= radius) | (d < start - EPSILON))).any()
+
 #Polygon is a set of points
 def pointOnPolygon(point, polygon):
 	last = None
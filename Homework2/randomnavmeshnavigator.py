@@ -40,7 +40,7 @@ class RandomNavMeshNavigator(NavMeshNavigator):
 	### self: the navigator object
 	### world: the world object		
 	def createPathNetwork(self, world):
-		self.pathnodes, self.pathnetwork, self.navmesh = myCreatePathNetwork(world, self.agent)
+		self.pathnodes, self.pathnetwork, self.navmesh = cachedPathNetwork(world, self.agent, myCreatePathNetwork)
 		return None
 		
 	### Finds the shortest path from the source to the destination.
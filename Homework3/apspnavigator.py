@@ -31,8 +31,8 @@ from mynavigatorhelpers import *
 ### Creates a path node network and implements the FloydWarshall all-pairs shortest-path algorithm to create a path to the given destination.
 class APSPNavigator(NavMeshNavigator):
 
-	### next: indicates which node to traverse to next to get to a given destination. A dictionary of dictionaries such that next[p1][p2] tells you where to go if you are at p1 and want to go to p2
-	### dist: the distance matrix. A dictionary of dictionaries such that dist[p1][p2] tells you how far from p1 to p2.
+	### next: indicates which node to traverse to next to get to a given destination. A NodeMatrix such that next[p1][p2] tells you where to go if you are at p1 and want to go to p2
+	### dist: the distance matrix. A NodeMatrix such that dist[p1][p2] tells you how far from p1 to p2.
 	def __init__(self):
 		NavMeshNavigator.__init__(self)
 		self.next = None
@@ -42,8 +42,8 @@ class APSPNavigator(NavMeshNavigator):
 	### self: the navigator object
 	### world: the world object
 	def createPathNetwork(self, world):
-		self.pathnodes, self.pathnetwork, self.navmesh = myCreatePathNetwork(world, self.agent)
-		self.next, self.dist = APSP(self.pathnodes, self.pathnetwork)
+		self.pathnodes, self.pathnetwork, self.navmesh = cachedPathNetwork(world, self.agent, myCreatePathNetwork)
+		self.next, self.dist = cachedAPSP(self.pathnodes, self.pathnetwork)
 		return None
 		
 	### Finds the shortest path from the source to the destination.
@@ -84,51 +84,99 @@ def findPath(start, end, next):
 	# Just keep appending nearest nodes onto the path
 	if next[start][end] is not None:
 		path.append(start)
-		while start is not end:
+		while start != end:
 			start = next[start][end]
 			path.append(start)
 	### YOUR CODE GOES ABOVE HERE ###
 	return path
 	
+### Returns the next and dist matrices for the path network as NodeMatrix objects, so next[p1][p2] and dist[p1][p2] work as they would for dictionaries of dictionaries.
+### nodes: the path nodes
+### edges: the edges between path nodes
 def APSP(nodes, edges):
-	next = {} # a dictionary of dictionaries. next[p1][p2] will give you the next node to go to, or None
-	dist = {} # a dictionary of dictionaries. dist[p1][p2] will give you the distance.
-	for n in nodes:
-		next[n] = {}
-		dist[n] = {}
+	index = nodeIndex(nodes) # a dictionary mapping each node to its row and column in the matrices below
+	n = len(nodes)
+	next = numpy.full((n, n), -1, dtype = numpy.int32) # next[i, j] is the number of the node to go to next, or -1
+	dist = numpy.full((n, n), INFINITY, dtype = numpy.float32) # dist[i, j] is the distance
 	### YOUR CODE GOES BELOW HERE ###
-		# Initialize next and dist matrices
-		for m in nodes:
-			next[n][m] = None
-			dist[n][m] = INFINITY
-
 	# Assign edge weights to dist and neighbors in next
 	for e in edges:
+		i = index[e[0]]
+		j = index[e[1]]
 		d = distance(e[0], e[1])
-		dist[e[0]][e[1]] = d
-		dist[e[1]][e[0]] = d
-		next[e[0]][e[1]] = e[1]
-		next[e[1]][e[0]] = e[0]
-
-	# Floyd-Warshall
-	for w in nodes:
-		for u in nodes:
-			for v in nodes:
-				if dist[u][v] > dist[u][w] + dist[w][v]:
-					next[u][v] = next[u][w]
-					dist[u][v] = dist[u][w] + dist[w][v]
-
-	"""
-	for k, v in dist.items():
-		print k
-		print v
-		val = v.items()
-		for thing in val:
-			print thing[1]
-		print ""
-	"""
+		dist[i, j] = d
+		dist[j, i] = d
+		next[i, j] = j
+		next[j, i] = i
+
+	# Floyd-Warshall, relaxing every pair through pivot w at once: going through w is dist[u, w] + dist[w, v]
+	for w in xrange(n):
+		through = dist[:, w:w+1] + dist[w:w+1, :]
+		shorter = through < dist
+		dist = numpy.where(shorter, through, dist)
+		next = numpy.where(shorter, next[:, w:w+1], next)
 	### YOUR CODE GOES ABOVE HERE ###
-	return next, dist
+	return NodeMatrix(nodes, index, next, True), NodeMatrix(nodes, index, dist)
+
+### Same as APSP(nodes, edges), but the matrices are loaded from the navigation cache (see cachedArrays) if they have been computed for this path network before
+def cachedAPSP(nodes, edges):
+	next, dist = cachedArrays(navigationCacheKey(nodes, edges, sourceOf(APSP)), ("next", "dist"), lambda: tuple(m.values for m in APSP(nodes, edges)))
+	index = nodeIndex(nodes)
+	return NodeMatrix(nodes, index, next, True), NodeMatrix(nodes, index, dist)
+
+### Returns a dictionary mapping each node to its place in the list
+def nodeIndex(nodes):
+	index = {}
+	for i in xrange(len(nodes)):
+		index[nodes[i]] = i
+	return index
+
+###############################
+### NodeMatrix
+###
+### A square array over the path nodes that is indexed by the nodes themselves: matrix[p1][p2], like a dictionary of dictionaries.
+
+class NodeMatrix():
+
+	### nodes: the path nodes, in row order
+	### index: dictionary mapping each path node to its row and column
+	### values: the N x N array
+	### nodeValued: True if the entries of values are node numbers, which are looked up in nodes (-1 is None)
+
+	def __init__(self, nodes, index, values, nodeValued = False):
+		self.nodes = nodes
+		self.index = index
+		self.values = values
+		self.nodeValued = nodeValued
+
+	def __contains__(self, node):
+		return node in self.index
+
+	def __getitem__(self, node):
+		return NodeMatrixRow(self, self.index[node])
+
+	### Returns the entry in row i and column j
+	def entry(self, i, j):
+		value = self.values[i, j]
+		if self.nodeValued:
+			if value < 0:
+				return None
+			return self.nodes[value]
+		return value
+
+### One row of a NodeMatrix, so that the second index of matrix[p1][p2] works
+
+class NodeMatrixRow():
+
+	def __init__(self, matrix, row):
+		self.matrix = matrix
+		self.row = row
+
+	def __contains__(self, node):
+		return node in self.matrix.index
+
+	def __getitem__(self, node):
+		return self.matrix.entry(self.row, self.matrix.index[node])
 
 ### Returns true if the agent can get from p1 to p2 directly without running into an obstacle.
 ### p1: the current location of the agent
@@ -137,29 +185,8 @@ def APSP(nodes, edges):
 ### agent: the Agent object
 def clearShot(p1, p2, worldLines, worldPoints, agent):
 	### YOUR CODE GOES BELOW HERE ###
-	threshold = 1.5 * agent.getRadius()
-
-	# Calculate angle of the line
-	dy = p1[1] - p2[1]
-	dx = p1[0] - p2[0]
-	theta = math.atan2(dy, dx)
-
-	# Calculate perpendicular angles
-	left = theta + math.pi / 2
-	right = theta - math.pi / 2
-
-	# Calculate points to draw parallel rays
-	leftPoint1 = (p1[0] + threshold * math.cos(left), p1[1] + threshold * math.sin(left))
-	leftPoint2 = (p2[0] + threshold * math.cos(left), p2[1] + threshold * math.sin(left))
-	rightPoint1 = (p1[0] + threshold * math.cos(right), p1[1] + threshold * math.sin(right))
-	rightPoint2 = (p2[0] + threshold * math.cos(right), p2[1] + threshold * math.sin(right))
-
-	# Check for obstacle collisions against three parallel lines
-	clear = True
-	for obstacle in worldLines:
-		if rayTrace(p1, p2, obstacle) is not None or rayTrace(leftPoint1, leftPoint2, obstacle) is not None or rayTrace(rightPoint1, rightPoint2, obstacle) is not None:
-			clear = False
-			break
+	# Check whether the agent can sweep from p1 to p2 without hitting an obstacle
+	clear = capsuleClear(p1, p2, 1.5 * agent.getRadius(), worldLines)
 
 	if clear:
 		return True
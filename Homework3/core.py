@@ -16,12 +16,16 @@
  * limitations under the License.
 '''
 
-import sys, pygame, math, numpy, random, time, copy
+import sys, pygame, math, numpy, random, time, copy, os
 from pygame.locals import * 
 
 from constants import *
 from utils import *
 
+# The navigation cache is shared by all the homeworks, so navigationcache.py lives in the directory above this one
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from navigationcache import *
+
 
 ###########################
 
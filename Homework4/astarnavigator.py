@@ -40,7 +40,7 @@ class AStarNavigator(NavMeshNavigator):
 	### self: the navigator object
 	### world: the world object
 	def createPathNetwork(self, world):
-		self.pathnodes, self.pathnetwork, self.navmesh = myCreatePathNetwork(world, self.agent)
+		self.pathnodes, self.pathnetwork, self.navmesh = cachedPathNetwork(world, self.agent, myCreatePathNetwork)
 		return None
 		
 	### Finds the shortest path from the source to the destination using A*.
@@ -157,7 +157,7 @@ def myUpdate(nav, delta):
 	### YOUR CODE GOES BELOW HERE ###
 	# If the agent is trapped, stop it from moving to force it to replan
 	#if rayTraceWorld(nav.agent.getLocation(), nav.agent.getMoveTarget(), gates) is not None:
-	if not clearShot(nav.agent.getLocation(), nav.agent.getMoveTarget(), nav.world.getGates(), None, nav.agent):
+	if not clearShot(nav.agent.getLocation(), nav.agent.getMoveTarget(), nav.world.getGates(), None, nav.agent, True):
 		nav.agent.stopMoving()
 	### YOUR CODE GOES ABOVE HERE ###
 	return None
@@ -173,31 +173,11 @@ def myCheckpoint(nav):
 ### p2: the destination of the agent
 ### worldLines: all the lines in the world
 ### agent: the Agent object
-def clearShot(p1, p2, worldLines, worldPoints, agent):
+### escaping: if True, lines the agent is already touching at p1 only count if it would move further into them (see capsuleClear)
+def clearShot(p1, p2, worldLines, worldPoints, agent, escaping = False):
 	### YOUR CODE GOES BELOW HERE ###
-	threshold = agent.getMaxRadius()
-
-	# Calculate angle of the line
-	dy = p1[1] - p2[1]
-	dx = p1[0] - p2[0]
-	theta = math.atan2(dy, dx)
-
-	# Calculate perpendicular angles
-	left = theta + math.pi / 2
-	right = theta - math.pi / 2
-
-	# Calculate points to draw parallel rays
-	leftPoint1 = (p1[0] + threshold * math.cos(left), p1[1] + threshold * math.sin(left))
-	leftPoint2 = (p2[0] + threshold * math.cos(left), p2[1] + threshold * math.sin(left))
-	rightPoint1 = (p1[0] + threshold * math.cos(right), p1[1] + threshold * math.sin(right))
-	rightPoint2 = (p2[0] + threshold * math.cos(right), p2[1] + threshold * math.sin(right))
-
-	# Check for obstacle collisions against three parallel lines
-	clear = True
-	#for obstacle in worldLines:
-	if rayTraceWorld(p1, p2, worldLines) is not None or rayTraceWorld(leftPoint1, leftPoint2, worldLines) is not None or rayTraceWorld(rightPoint1, rightPoint2, worldLines) is not None:
-		clear = False
-		#break
+	# Check whether the agent can sweep from p1 to p2 without hitting an obstacle
+	clear = capsuleClear(p1, p2, agent.getMaxRadius(), worldLines, escaping)
 
 	if clear:
 		return True
@@ -172,23 +172,8 @@ def myCreatePathNetwork(world, agent = None):
 						(pointOnPolygon(node0, poly) or pointInsidePolygonPoints(node0, poly)) and \
 						(pointOnPolygon(node1, poly) or pointInsidePolygonPoints(node1, poly)) and \
 						(node0, node1) not in edges and (node1, node0) not in edges:
-					# Calculate angle of the line
-					dy = node0[1] - node1[1]
-					dx = node0[0] - node1[0]
-					theta = math.atan2(dy, dx)
-
-					# Calculate perpendicular angles
-					left = theta + math.pi / 2
-					right = theta - math.pi / 2
-
-					# Calculate points to draw parallel rays
-					leftPoint0 = (node0[0] + radius * math.cos(left), node0[1] + radius * math.sin(left))
-					leftPoint2 = (node1[0] + radius * math.cos(left), node1[1] + radius * math.sin(left))
-					rightPoint0 = (node0[0] + radius * math.cos(right), node0[1] + radius * math.sin(right))
-					rightPoint1 = (node1[0] + radius * math.cos(right), node1[1] + radius * math.sin(right))
-
-					# Check for obstacle collisions against three parallel lines and connect pathnodes if no collisions are found
-					if rayTraceWorld(node0, node1, lines) is None and rayTraceWorld(leftPoint0, leftPoint2, lines) is None and rayTraceWorld(rightPoint0, rightPoint1, lines) is None:
+					# Connect pathnodes if the agent can sweep from one to the other without hitting an obstacle
+					if capsuleClear(node0, node1, radius, lines):
 						edges.append((node0, node1))
 						if node0 not in connectedNodes:
 							connectedNodes.append(node0)
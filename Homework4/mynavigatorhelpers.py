@@ -79,29 +79,8 @@ def mySmooth(nav):
 ### agent: the Agent object
 def clearShot(p1, p2, worldLines, agent):
 	### YOUR CODE GOES BELOW HERE ###
-	threshold = agent.getMaxRadius()
-
-	# Calculate angle of the line
-	dy = p1[1] - p2[1]
-	dx = p1[0] - p2[0]
-	theta = math.atan2(dy, dx)
-
-	# Calculate perpendicular angles
-	left = theta + math.pi / 2
-	right = theta - math.pi / 2
-
-	# Calculate points to draw parallel rays
-	leftPoint1 = (p1[0] + threshold * math.cos(left), p1[1] + threshold * math.sin(left))
-	leftPoint2 = (p2[0] + threshold * math.cos(left), p2[1] + threshold * math.sin(left))
-	rightPoint1 = (p1[0] + threshold * math.cos(right), p1[1] + threshold * math.sin(right))
-	rightPoint2 = (p2[0] + threshold * math.cos(right), p2[1] + threshold * math.sin(right))
-
-	# Check for obstacle collisions against three parallel lines
-	clear = True
-	for obstacle in worldLines:
-		if rayTrace(p1, p2, obstacle) is not None or rayTrace(leftPoint1, leftPoint2, obstacle) is not None or rayTrace(rightPoint1, rightPoint2, obstacle) is not None:
-			clear = False
-			break
+	# Check whether the agent can sweep from p1 to p2 without hitting an obstacle
+	clear = capsuleClear(p1, p2, agent.getMaxRadius(), worldLines)
 
 	if clear:
 		return True
@@ -33,14 +33,19 @@ import heapq
 			
 class AStarNavigator(NavMeshNavigator):
 
+	### pathcache: the paths already found (see PathCache), shared with clones of this navigator
+
 	def __init__(self):
 		NavMeshNavigator.__init__(self)
+		self.pathcache = None
 
 	### Create the pathnode network and pre-compute all shortest paths along the network.
 	### self: the navigator object
 	### world: the world object
 	def createPathNetwork(self, world):
-		self.pathnodes, self.pathnetwork, self.navmesh = myCreatePathNetwork(world, self.agent)
+		self.pathnodes, self.pathnetwork, self.navmesh = cachedPathNetwork(world, self.agent, myCreatePathNetwork)
+		self.pathgraph = PathGraph(self.pathnodes, self.pathnetwork)
+		self.pathcache = world.makePathCache()
 		return None
 		
 	### Finds the shortest path from the source to the destination using A*.
@@ -66,11 +71,9 @@ class AStarNavigator(NavMeshNavigator):
 				start = findClosestUnobstructed(source, self.pathnodes, self.world.getLinesWithoutBorders())
 				end = findClosestUnobstructed(dest, self.pathnodes, self.world.getLinesWithoutBorders())
 				if start != None and end != None:
-					#print len(self.pathnetwork)
-					newnetwork = unobstructedNetwork(self.pathnetwork, self.world.getGates())
-					#print len(newnetwork)
-					closedlist = []
-					path, closedlist = astar(start, end, newnetwork)
+					graph = self.pathgraph
+					blocked = self.world.getBlockedEdges(graph)
+					path = self.pathcache.lookup(graph.getNodeId(start), graph.getNodeId(end), self.world.getGeometryVersion(), lambda i, j: astar(graph.nodes[i], graph.nodes[j], graph, blocked)[0])
 					if path is not None and len(path) > 0:
 						path = shortcutPath(source, dest, path, self.world, self.agent)
 						self.setPath(path)
@@ -93,70 +96,65 @@ class AStarNavigator(NavMeshNavigator):
 	def update(self, delta):
 		myUpdate(self, delta)
 
-def unobstructedNetwork(network, worldLines):
-	newnetwork = []
-	for l in network:
-		hit = rayTraceWorld(l[0], l[1], worldLines)
-		if hit == None:
-			newnetwork.append(l)
-	return newnetwork
-
-def astar(init, goal, network):
+### Finds the shortest path from init to goal over a PathGraph using A*.
+### init, goal: path nodes
+### network: the PathGraph
+### blocked: bytearray with an entry per edge, 1 for the edges that can't be used (see GameWorld.getBlockedEdges), or None if every edge can be used
+### Returns the path as a list of path nodes, and the list of path nodes that were expanded.
+def astar(init, goal, network, blocked = None):
 	path = []
 	open = []
 	closed = []
 	### YOUR CODE GOES BELOW HERE ###
-	openSet = set()
+	start = network.getNodeId(init)
+	end = network.getNodeId(goal)
+	if start is None or end is None:
+		return path, closed
+	if blocked is None:
+		blocked = network.unblocked
+	nodes = network.nodes
+	adjacency = network.adjacency
+	heuristic = network.distancesTo(goal)
 	closedSet = set()
 	origin = {}
-	gScore = {}
-	fScore = {}
+	gScore = {start: 0}
 
-	heapq.heappush(open, (0, init))
-	openSet.add(init)
-	gScore[init] = 0
-	fScore[init] = distance(init, goal)
+	heapq.heappush(open, (heuristic[start], start))
 
 	while len(open) > 0:
-		curr = heapq.heappop(open)
-
-		if curr[1] is goal:
-			currNode = curr[1]
-			path.append(currNode)
-			while currNode in origin.keys():
-				currNode = origin[currNode]
-				path.append(currNode)
+		curr = heapq.heappop(open)[1]
+		# A node can be pushed again when a shorter way to it is found; only the first pop counts
+		if curr in closedSet:
+			continue
+
+		if curr == end:
+			while curr != start:
+				path.append(nodes[curr])
+				curr = origin[curr]
+			path.append(nodes[start])
 			path.reverse()
-			closed = list(closedSet)
+			closed = [nodes[n] for n in closedSet]
 			return path, closed
 
-		openSet.remove(curr[1])
-		closedSet.add(curr[1])
-
-		for edge in network:
-			if curr[1] in edge:
-				neighbor = edge[0]
-				if curr[1] is edge[0]:
-					neighbor = edge[1]
-
-				if neighbor not in closedSet:
-					cost = gScore[curr[1]] + distance(neighbor, goal)
-					if neighbor not in openSet:
-						openSet.add(neighbor)
-						heapq.heappush(open, (cost, neighbor))
-					elif cost >= gScore[neighbor]:
-						continue
-
-					origin[neighbor] = curr[1]
-					gScore[neighbor] = cost
-					fScore[neighbor] = gScore[neighbor] + distance(neighbor, goal)
+		closedSet.add(curr)
+		g = gScore[curr]
+
+		for neighbor, length, edge in adjacency[curr]:
+			if neighbor in closedSet or blocked[edge]:
+				continue
+			cost = g + length
+			if cost < gScore.get(neighbor, INFINITY):
+				origin[neighbor] = curr
+				gScore[neighbor] = cost
+				heapq.heappush(open, (cost + heuristic[neighbor], neighbor))
+	closed = [nodes[n] for n in closedSet]
 	### YOUR CODE GOES ABOVE HERE ###
 	return path, closed
 
 def myUpdate(nav, delta):
 	### YOUR CODE GOES BELOW HERE ###
 	# If the agent is trapped, stop it from moving to force it to replan
-	if not clearShot(nav.agent.getLocation(), nav.agent.getMoveTarget(), nav.world.getGates(), None, nav.agent):
+	if not clearShot(nav.agent.getLocation(), nav.agent.getMoveTarget(), nav.world.getGates(), None, nav.agent, True):
 		nav.agent.stopMoving()
 	### YOUR CODE GOES ABOVE HERE ###
 	return None
@@ -172,31 +170,11 @@ def myCheckpoint(nav):
 ### p2: the destination of the agent
 ### worldLines: all the lines in the world
 ### agent: the Agent object
-def clearShot(p1, p2, worldLines, worldPoints, agent):
+### escaping: if True, lines the agent is already touching at p1 only count if it would move further into them (see capsuleClear)
+def clearShot(p1, p2, worldLines, worldPoints, agent, escaping = False):
 	### YOUR CODE GOES BELOW HERE ###
-	threshold = agent.getMaxRadius()
-
-	# Calculate angle of the line
-	dy = p1[1] - p2[1]
-	dx = p1[0] - p2[0]
-	theta = math.atan2(dy, dx)
-
-	# Calculate perpendicular angles
-	left = theta + math.pi / 2
-	right = theta - math.pi / 2
-
-	# Calculate points to draw parallel rays
-	leftPoint1 = (p1[0] + threshold * math.cos(left), p1[1] + threshold * math.sin(left))
-	leftPoint2 = (p2[0] + threshold * math.cos(left), p2[1] + threshold * math.sin(left))
-	rightPoint1 = (p1[0] + threshold * math.cos(right), p1[1] + threshold * math.sin(right))
-	rightPoint2 = (p2[0] + threshold * math.cos(right), p2[1] + threshold * math.sin(right))
-
-	# Check for obstacle collisions against three parallel lines
-	clear = True
-	#for obstacle in worldLines:
-	if rayTraceWorld(p1, p2, worldLines) is not None or rayTraceWorld(leftPoint1, leftPoint2, worldLines) is not None or rayTraceWorld(rightPoint1, rightPoint2, worldLines) is not None:
-		clear = False
-		#break
+	# Check whether the agent can sweep from p1 to p2 without hitting an obstacle
+	clear = capsuleClear(p1, p2, agent.getMaxRadius(), worldLines, escaping)
 
 	if clear:
 		return True
@@ -40,4 +40,6 @@ def cloneAStarNavigator(nav):
 	newnav.world = nav.world
 	newnav.pathnodes = nav.pathnodes
 	newnav.pathnetwork = nav.pathnetwork
+	newnav.pathgraph = nav.pathgraph
+	newnav.pathcache = nav.pathcache
 	return newnav
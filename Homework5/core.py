@@ -16,12 +16,17 @@
  * limitations under the License.
 '''
 
-import sys, pygame, math, numpy, random, time, copy
+import sys, pygame, math, numpy, random, time, copy, atexit, os
+from collections import deque
 from pygame.locals import * 
 
 from constants import *
 from utils import *
 
+# The navigation cache is shared by all the homeworks, so navigationcache.py lives in the directory above this one
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from navigationcache import *
+
 
 ###########################
 
@@ -52,7 +57,7 @@ class Mover(pygame.sprite.Sprite, Thing):
 		
 	### rect: the rectangle
 	### image: the image, rotated to orientation
-	### originalImage: the image un-rotated
+	### originalImage: the image un-rotated (shared with every other mover using the same image)
 	### orientation: direction agent is facing in degrees (0 = to the right)
 	### speed: how fast the agent moves (horizontal, vertical)
 	### maxradius: the worst-case scenario for the bounding circle, accounting for rotation changing the dimensions of the agent's bounding box.
@@ -64,7 +69,7 @@ class Mover(pygame.sprite.Sprite, Thing):
 	def __init__(self, image, position, orientation, speed, world):
 		pygame.sprite.Sprite.__init__(self) # call sprite initializer
 		self.image, self.rect = load_image(image, -1)
-		self.originalImage = self.image.copy()
+		self.originalImage = self.image
 		self.orientation = orientation
 		self.world = world
 		self.speed = speed
@@ -100,8 +105,7 @@ class Mover(pygame.sprite.Sprite, Thing):
 			#unwind
 			angle = 360+angle
 		self.orientation = angle
-		rot_img = pygame.transform.rotate(self.originalImage, self.orientation)
-		img_rect = rot_img.get_rect()
+		rot_img, img_rect = rotate_image(self.originalImage, self.orientation)
 		img_rect.center = self.position
 		self.image = rot_img
 		self.rect = img_rect
@@ -168,12 +172,13 @@ class Bullet(Mover):
 	
 	### damage: amount of damage
 	### distanceTraveled: the total amount of distance traveled by the agent
-
+	### range: how far the bullet will travel before expiring
 
 	def __init__(self, position, orientation, world, image = SMALLBULLET, speed = SMALLBULLETSPEED, damage = SMALLBULLETDAMAGE):
 		Mover.__init__(self, image, position, orientation, speed, world)
 		self.damage = damage
 		self.distanceTraveled = 0
+		self.range = INFINITY
 		
 	def getDamage(self):
 		return self.damage
@@ -189,8 +194,15 @@ class Bullet(Mover):
 		next = [m*n for m,n in zip(normalizedDirection,self.speed)]
 		self.distanceTraveled = self.distanceTraveled + distance((0,0), next)
 		self.move(next)
+		self.checkRange()
 		return None
 
+	### Expire if the bullet has gone further than its range
+	def checkRange(self):
+		if self.distanceTraveled > self.range:
+			self.speed = (0, 0)
+			self.world.deleteBullet(self)
+
 	def collision(self, thing):
 		Mover.collision(self, thing)
 		if self.hit(thing):
@@ -257,7 +269,7 @@ class Agent(Mover):
 				self.moveTarget = None
 				self.moveOrigin = None
 				if self.navigator != None:
-					self.navigator.doneMoving()
+					self.world.timed("navigator", self.navigator.doneMoving)
 					self.doneMoving()
 			else:
 				# Move
@@ -270,10 +282,10 @@ class Agent(Mover):
 				#next = [m*n for m,n in zip(normalizedDirection,self.speed)]
 				self.distanceTraveled = self.distanceTraveled + distance((0,0), next)
 				self.move(next)
-				self.navigator.update(delta)
+				self.world.timed("navigator", self.navigator.update, delta)
 				# Check for shortcut
 				if self.navigator != None:
-					self.navigator.smooth()
+					self.world.timed("navigator", self.navigator.smooth)
 		if self.canfire == False:
 			self.firetimer = self.firetimer + 1
 			if self.firetimer >= self.firerate:
@@ -293,7 +305,7 @@ class Agent(Mover):
 				self.moveTarget = None
 				self.moveOrigin = None
 				if self.navigator != None:
-					self.navigator.collision(thing)
+					self.world.timed("navigator", self.navigator.collision, thing)
 		return None
 		
 			
@@ -311,12 +323,12 @@ class Agent(Mover):
 
 	def navigateTo(self, pos):
 		if self.navigator != None:
-			self.navigator.computePath(self.position, pos)
+			self.world.timed("navigator", self.navigator.computePath, self.position, pos)
 
 	### Shoot the gun. Return the bullet that was spawned, or None.
 	def shoot(self):
 		if self.canfire:
-			bullet = self.bulletclass(self.position, self.orientation, self.world)
+			bullet = self.world.makeBullet(self.bulletclass, self.position, self.orientation)
 			bullet.setOwner(self)
 			self.world.addBullet(bullet)
 			self.canfire = False
@@ -326,6 +338,7 @@ class Agent(Mover):
 			
 	def setTeam(self, team):
 		self.team = team
+		self.world.entities.teamChanged()
 		
 	def getTeam(self):
 		return self.team
@@ -530,6 +543,167 @@ class Navigator():
 		return None
 
 
+#####################
+### PathGraph
+###
+### A path network indexed for searching. Nodes are numbered in the order they are given and edges in the order they are given.
+### The edges leaving node i are stored in compressed rows: entries offsets[i] to offsets[i+1]-1 of neighbors, lengths, and edgeIds.
+
+class PathGraph():
+
+	### nodes: list of the path nodes; a node's number is its place in this list
+	### ids: dictionary mapping a path node to its number
+	### coordinates: (V, 2) array of the path nodes
+	### edges: list of the edges between path nodes; an edge's number is its place in this list
+	### edgeArray: (E, 4) array of the edges
+	### offsets: (V+1) array; the edges leaving node i are entries offsets[i] to offsets[i+1]-1 of the arrays below
+	### neighbors: (2E) array of the node at the other end of each edge
+	### lengths: (2E) array of the length of each edge
+	### edgeIds: (2E) array of the number of each edge
+	### adjacency: list of (neighbor, length, edge number) tuples leaving each node, the same as the arrays above in a form that is quicker to walk from Python
+	### lineEdges: dictionary mapping a line to the list of numbers of the edges it crosses, for lines that have been asked about
+	### unblocked: bytearray with a 0 for every edge, for searches where nothing is blocked (see GameWorld.getBlockedEdges). Must not be changed.
+
+	def __init__(self, nodes, edges):
+		self.nodes = list(nodes)
+		self.ids = {}
+		for i in xrange(len(self.nodes)):
+			self.ids[self.nodes[i]] = i
+		self.edges = list(edges)
+		for e in self.edges:
+			for p in e:
+				if p not in self.ids:
+					self.ids[p] = len(self.nodes)
+					self.nodes.append(p)
+		self.coordinates = numpy.array(self.nodes, dtype = float).reshape(-1, 2)
+		self.edgeArray = numpy.array(self.edges, dtype = float).reshape(-1, 4)
+		# Each edge can be walked both ways, so it goes into the rows of both of its ends
+		a = numpy.array([self.ids[e[0]] for e in self.edges], dtype = int)
+		b = numpy.array([self.ids[e[1]] for e in self.edges], dtype = int)
+		sources = numpy.concatenate((a, b))
+		order = numpy.argsort(sources, kind = 'mergesort')
+		self.neighbors = numpy.concatenate((b, a))[order]
+		self.edgeIds = numpy.concatenate((numpy.arange(len(self.edges)), numpy.arange(len(self.edges))))[order]
+		self.lengths = numpy.hypot(self.edgeArray[:, 2] - self.edgeArray[:, 0], self.edgeArray[:, 3] - self.edgeArray[:, 1])[self.edgeIds]
+		self.offsets = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(sources, minlength = len(self.nodes)))))
+		self.adjacency = []
+		neighbors, lengths, edgeIds, offsets = self.neighbors.tolist(), self.lengths.tolist(), self.edgeIds.tolist(), self.offsets.tolist()
+		for i in xrange(len(self.nodes)):
+			self.adjacency.append(zip(neighbors[offsets[i]:offsets[i+1]], lengths[offsets[i]:offsets[i+1]], edgeIds[offsets[i]:offsets[i+1]]))
+		self.lineEdges = {}
+		self.unblocked = bytearray(len(self.edges))
+
+	### Returns the number of a path node, or None if it is not in the graph
+	def getNodeId(self, point):
+		return self.ids.get(point)
+
+	### Returns the straight-line distance from every path node to a point, as a list indexed by node number
+	def distancesTo(self, point):
+		return numpy.hypot(self.coordinates[:, 0] - point[0], self.coordinates[:, 1] - point[1]).tolist()
+
+	### Works out which edges each of the given lines crosses, all at once, and remembers them in lineEdges
+	def maskLines(self, lines):
+		lines = [l for l in lines if l not in self.lineEdges]
+		if len(lines) == 0:
+			return
+		crossed = numpy.zeros((len(self.edges), len(lines)), dtype = bool)
+		if len(self.edges) > 0:
+			crossed = segmentsIntersect(self.edgeArray, packLines(lines))
+		for j in xrange(len(lines)):
+			self.lineEdges[lines[j]] = numpy.flatnonzero(crossed[:, j]).tolist()
+
+	### Returns a bytearray with an entry per edge: 1 if the edge crosses any of the given lines, 0 if not
+	def crossedEdges(self, lines):
+		self.maskLines(lines)
+		crossed = bytearray(len(self.edges))
+		for l in lines:
+			for i in self.lineEdges[l]:
+				crossed[i] = 1
+		return crossed
+
+#####################
+### GenerationalCache
+###
+### Remembers values worked out for keys, for as long as the world's geometry stays the same. When the geometry version changes, everything remembered is thrown away.
+### Values are kept in two generations so that the least recently used ones can be dropped without any bookkeeping on each lookup:
+### keys are looked up in recent, then in old (and moved to recent if found there). When recent is full, it becomes old and the previous old is dropped.
+### So between capacity/2 and capacity of the most recently used values are remembered. Values can't be None.
+
+class GenerationalCache():
+
+	### capacity: the most values to remember
+	### recent: dictionary mapping a key to its value, for keys used since old was made
+	### old: the same, for keys that haven't been used since then
+	### version: the geometry version the values were worked out for
+	### hits: the number of lookups answered from recent or old
+	### misses: the number of lookups that had to work the value out
+
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self.recent = {}
+		self.old = {}
+		self.version = None
+		self.hits = 0
+		self.misses = 0
+
+	### Forget everything
+	def clear(self):
+		self.recent = {}
+		self.old = {}
+
+	### Returns the value for key, calling compute() to work it out if it isn't remembered.
+	### version: the current geometry version
+	def get(self, key, version, compute):
+		if version != self.version:
+			self.clear()
+			self.version = version
+		value = self.recent.get(key)
+		if value is not None:
+			self.hits = self.hits + 1
+			return value
+		value = self.old.get(key)
+		if value is not None:
+			self.hits = self.hits + 1
+		else:
+			self.misses = self.misses + 1
+			value = compute()
+		if len(self.recent) * 2 >= self.capacity:
+			self.old = self.recent
+			self.recent = {}
+		self.recent[key] = value
+		return value
+
+	### Returns the fraction of lookups that were answered without working the value out
+	def hitRate(self):
+		lookups = self.hits + self.misses
+		if lookups == 0:
+			return 0.0
+		return self.hits / float(lookups)
+
+	### Returns the number of values remembered
+	def size(self):
+		return len(self.recent) + len(self.old)
+
+#####################
+### PathCache
+###
+### Remembers paths found between pairs of path nodes, so navigators that share it don't search for the same path twice.
+### Paths are only good for the geometry (including the gates) they were found with, so everything is forgotten when the geometry version changes (see GenerationalCache).
+
+class PathCache(GenerationalCache):
+
+	def __init__(self, capacity = PATHCACHESIZE):
+		GenerationalCache.__init__(self, capacity)
+
+	### Returns the path from start to end as a new list.
+	### version: the current geometry version
+	### search: search(start, end) returns the path from start to end (e.g., a call to astar)
+	def lookup(self, start, end, version, search):
+		return list(self.get((start, end), version, lambda: tuple(search(start, end))))
+
+	def report(self):
+		return "Path cache: %d lookups, %d hits (%.1f%%), %d paths remembered" % (self.hits + self.misses, self.hits, self.hitRate() * 100.0, self.size())
+
 #####################
 ### PathNetworkNavigator
 ###
@@ -539,14 +713,16 @@ class PathNetworkNavigator(Navigator):
 
 	### pathnodes: the path nodes
 	### pathnetwork: the edges between path nodes
+	### pathgraph: the path nodes and edges indexed for searching (see PathGraph), for navigators that build one
 
 	def __init__(self):
 		Navigator.__init__(self)
 		self.pathnodes = None
 		self.pathnetwork = None
+		self.pathgraph = None
 
 	def drawPathNetwork(self, surface):
-		if self.pathnetwork is not None:
+		if self.pathnetwork is not None and surface is not None:
 			for l in self.pathnetwork:
 				pygame.draw.line(surface, (0, 0, 255), l[0], l[1], 1)
 
@@ -612,6 +788,11 @@ class Obstacle(Thing, Blocker):
 	### lines: lines of polygon relative to center
 	### surface: the surface
 	### rect: the rectangle of the surface
+	### box: the bounding box of the polygon in world coordinates (minpt, maxpt), computed on demand
+	### polygon: the points compiled for testing whether points are inside (CompiledPolygon), computed on demand
+	### pointArray: the points packed into a (P, 2) array (see compileGeometry)
+	### lineArray: the lines packed into a (P, 4) array (x1, y1, x2, y2) (see packLines)
+	### pointIndex: dictionary mapping each point to where it is in points
 	
 	def __init__(self):
 		self.points = []
@@ -619,6 +800,19 @@ class Obstacle(Thing, Blocker):
 		self.lines = []
 		self.surface = None
 		self.rect = None
+		self.box = None
+		self.polygon = None
+		self.pointArray = numpy.zeros((0, 2))
+		self.lineArray = numpy.zeros((0, 4))
+		self.pointIndex = {}
+
+	### Pack the points and lines into arrays and index the points. Subclasses call this once they have made their points and lines.
+	def compileGeometry(self):
+		self.pointArray = numpy.array(self.points, dtype = float).reshape(-1, 2)
+		self.lineArray = packLines(self.lines)
+		self.pointIndex = {}
+		for i, p in enumerate(self.points):
+			self.pointIndex.setdefault(p, i)
 		
 	### Draw me
 	def draw(self, parent):
@@ -639,18 +833,45 @@ class Obstacle(Thing, Blocker):
 		#return [tuple(i) for i in points]
 		return self.points
 
+	### Returns the axis-aligned bounding box of the polygon as (minpt, maxpt)
+	def getBoundingBox(self):
+		if self.box is None:
+			points = self.getPoints()
+			self.box = ( (min(map(lambda p: p[0], points)), min(map(lambda p: p[1], points))), (max(map(lambda p: p[0], points)), max(map(lambda p: p[1], points))) )
+		return self.box
+
+	### Returns the points packed into a (P, 2) array
+	def getPointArray(self):
+		return self.pointArray
+
+	### Returns the lines packed into a (P, 4) array
+	def getLineArray(self):
+		return self.lineArray
+
 	### Is a point one of the obstacle points?
 	def isInPoints(self, point):
-		return point in self.getPoints()
+		return point in self.pointIndex
 		
+	### Are p1 and p2 next to each other around the polygon?
 	def twoAdjacentPoints(self, p1, p2):
-		if self.isInPoints(p1) and self.isInPoints(p2):
-			return (abs(self.points.index(p1) - self.points.index(p2)) == 1) or (p1 == self.points[0] and p2 == self.points[len(self.points)-1]) or (p2 == self.points[0] and p1 == self.points[len(self.points)-1])
-		else:
+		i = self.pointIndex.get(p1)
+		j = self.pointIndex.get(p2)
+		if i is None or j is None:
 			return False
+		return abs(i - j) == 1 or abs(i - j) == len(self.points) - 1
 			
+	def getPolygon(self):
+		if self.polygon is None:
+			self.polygon = CompiledPolygon(self.getPoints())
+		return self.polygon
+
+	### Is the point inside the obstacle (or on its boundary)?
 	def pointInside(self, point):
-		return pointInsidePolygonLines(point, self.lines)
+		return self.getPolygon().contains(point)
+
+	### Which of the points are inside the obstacle? Returns an array of booleans.
+	def pointsInside(self, points):
+		return self.getPolygon().containsPoints(points)
 
 ######################
 ### Decoration
@@ -662,8 +883,7 @@ class Decoration(pygame.sprite.Sprite):
 		self.image, self.rect = load_image(image, -1)
 		## Translate to initial position
 		self.rect = self.rect.move(position)
-		rot_img = pygame.transform.rotate(self.image, orientation)
-		img_rect = rot_img.get_rect()
+		rot_img, img_rect = rotate_image(self.image, orientation)
 		img_rect.center = self.rect.center
 		self.image = rot_img
 		self.rect = img_rect
@@ -678,7 +898,7 @@ class Decoration(pygame.sprite.Sprite):
 
 class RandomObstacle(Obstacle):
 
-	def __init__(self, num, pos, radius, sigma, min, color = (0, 0, 0), linewidth = 4):
+	def __init__(self, num, pos, radius, sigma, min, color = (0, 0, 0), linewidth = 4, headless = False):
 		Obstacle.__init__(self)
 		self.pos = pos
 		points = []
@@ -697,10 +917,12 @@ class RandomObstacle(Obstacle):
 		for (rad, dist) in sphericals:
 			points.append(((int(math.cos(rad)*dist)+radius), int((math.sin(rad)*dist)+radius)))
 		# Create surface
-		s = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA, 32)
-		s = s.convert_alpha()
-		# Draw polygon on surface
-		pygame.draw.lines(s, color, True, points, linewidth)
+		s = None
+		if not headless:
+			s = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA, 32)
+			s = s.convert_alpha()
+			# Draw polygon on surface
+			pygame.draw.lines(s, color, True, points, linewidth)
 		# translate points to absolute space
 		transpoints = []
 		for p in points:
@@ -714,10 +936,11 @@ class RandomObstacle(Obstacle):
 			p_last = p
 		lines.append((transpoints[len(transpoints)-1], transpoints[0]))
 		# Store some stuff
-		self.rect = s.get_rect()
+		self.rect = pygame.Rect(0, 0, radius*2, radius*2)
 		self.surface = s
 		self.lines = lines
 		self.points = transpoints
+		self.compileGeometry()
 #		print "points", self.points
 		
 		
@@ -744,16 +967,18 @@ class ManualObstacle(Obstacle):
 	# Points must be in clockwise or counterclockwise order, and relative to (0,0)
 	# color = line color
 	# linewidth = width of the lines
-	def __init__(self, points, color = (0, 0, 0), linewidth = 4, sprite = None):
+	# headless = don't create a surface or decorations (nothing will ever be drawn). The random numbers for the decorations are still drawn, so a headless world plays out the same as a windowed one with the same seed.
+	def __init__(self, points, color = (0, 0, 0), linewidth = 4, sprite = None, headless = False):
 		Obstacle.__init__(self)
 		minpt = ( min(map(lambda p: p[0], points)), min(map(lambda p: p[1], points)) )
 		maxpt = ( max(map(lambda p: p[0], points)), max(map(lambda p: p[1], points)) )
 		# create surface
-		s = pygame.Surface((maxpt[0]+linewidth, maxpt[1]+linewidth), pygame.SRCALPHA, 32)
-		s = s.convert_alpha()
-		pygame.draw.lines(s, color, True, points, linewidth)
-		self.surface = s
-		self.rect = s.get_rect()
+		if not headless:
+			s = pygame.Surface((maxpt[0]+linewidth, maxpt[1]+linewidth), pygame.SRCALPHA, 32)
+			s = s.convert_alpha()
+			pygame.draw.lines(s, color, True, points, linewidth)
+			self.surface = s
+		self.rect = pygame.Rect(0, 0, maxpt[0]+linewidth, maxpt[1]+linewidth)
 		#transpoints = []
 		#for p in points:
 		#	transpoints.append((p[0] + self.pos[0], p[1] + self.pos[1]))
@@ -768,17 +993,19 @@ class ManualObstacle(Obstacle):
 			last = p
 		lines.append((points[len(points)-1], points[0]))
 		self.lines = lines
+		self.compileGeometry()
 		# Decorations
 		self.decorations = []
 		self.sprites = pygame.sprite.RenderPlain()
 		if sprite is not None:
 			dec = Decoration(sprite, (0, 0))
 			pos = (0, 0)
+			polygon = self.getPolygon()
 			for x in xrange((self.rect.width*2)/dec.rect.width):
 				for y in xrange((self.rect.height*2)/dec.rect.height):
 					pos = (((x/2)*dec.rect.width)+corerandom.uniform(0, dec.rect.width/5.0), ((y/2)*dec.rect.height)+corerandom.uniform(0, dec.rect.height/5.0))
 					orient = corerandom.uniform(0, 360.0)
-					if pointInsidePolygonPoints((pos[0]+dec.rect.width/2.0, pos[1]+dec.rect.height/2.0), points):
+					if not headless and polygon.contains((pos[0]+dec.rect.width/2.0, pos[1]+dec.rect.height/2.0)):
 						d = Decoration(sprite, pos, orient)
 						self.decorations.append(d)
 						self.sprites.add(d)
@@ -786,7 +1013,383 @@ class ManualObstacle(Obstacle):
 	### Draw me
 	def draw(self, parent):
 		Obstacle.draw(self, parent)
-		self.sprites.draw(self.surface)
+		if self.surface is not None:
+			self.sprites.draw(self.surface)
+
+############################
+### SwapList
+###
+### A list of unique things that can remove any of them in O(1), by moving the last thing into the removed thing's slot.
+### Removal does not preserve order: the last thing takes the removed thing's place, so iterating over a SwapList (e.g., GameWorld.movers) visits things in a different order
+### than a plain list would after a removal. The order is still the same from run to run. Only append() and remove() may be used to change the list, because they keep track of where everything is.
+
+class SwapList(list):
+
+	### positions: dictionary mapping each thing in the list to its index
+
+	def __init__(self, things = None):
+		list.__init__(self)
+		self.positions = {}
+		if things is not None:
+			for x in things:
+				self.append(x)
+
+	def append(self, thing):
+		self.positions[thing] = len(self)
+		list.append(self, thing)
+
+	def remove(self, thing):
+		if thing not in self.positions:
+			raise ValueError("SwapList.remove(x): x not in list")
+		index = self.positions.pop(thing)
+		last = list.pop(self)
+		if last is not thing:
+			self[index] = last
+			self.positions[last] = index
+
+	def __contains__(self, thing):
+		return thing in self.positions
+
+############################
+### EntityRegistry
+###
+### Keeps track of every mover in the world. Each thing that is added gets a stable integer id and is filed under a kind (e.g., "npc" or "bullet").
+### Adding and removing are O(1).
+### Snapshots (everything of a kind, or everything of a kind on/not on a team) are kept as tuples that are only rebuilt after something of that kind is added or removed,
+### so they can be asked for every tick without filtering the movers again. Every caller gets the same tuple, so callers that want to change it make their own list.
+### Teams are read when a snapshot is built, so the team snapshots are dropped whenever something changes team (see teamChanged).
+
+class EntityRegistry():
+
+	### entities: dictionary mapping entity id to thing
+	### nextId: the id that the next thing added will get
+	### all: everything in the registry, in a SwapList
+	### kinds: dictionary mapping kind to a SwapList of the things of that kind
+	### snapshots: dictionary mapping kind to a dictionary of the cached snapshots of that kind
+
+	def __init__(self):
+		self.entities = {}
+		self.nextId = 0
+		self.all = SwapList()
+		self.kinds = {}
+		self.snapshots = {}
+
+	def add(self, thing, kind):
+		thing.entityId = self.nextId
+		self.nextId = self.nextId + 1
+		self.entities[thing.entityId] = thing
+		self.all.append(thing)
+		self.view(kind).append(thing)
+		self.snapshots[kind] = {}
+
+	def remove(self, thing, kind):
+		self.view(kind).remove(thing)
+		self.all.remove(thing)
+		del self.entities[thing.entityId]
+		self.snapshots[kind] = {}
+
+	def get(self, entityId):
+		return self.entities.get(entityId)
+
+	### Returns the live list of things of a kind. It changes as things are added and removed, so copy it before adding or removing while iterating.
+	def view(self, kind):
+		if kind not in self.kinds:
+			self.kinds[kind] = SwapList()
+		return self.kinds[kind]
+
+	### Returns a tuple of the things of a kind
+	def snapshot(self, kind):
+		return self.cached(kind, None, lambda: tuple(self.view(kind)))
+
+	### Returns a tuple of the things of a kind that are on the team
+	def forTeam(self, kind, team):
+		return self.cached(kind, (True, team), lambda: tuple(x for x in self.view(kind) if x.getTeam() == team))
+
+	### Returns a tuple of the things of a kind that are not on the team
+	def notForTeam(self, kind, team):
+		return self.cached(kind, (False, team), lambda: tuple(x for x in self.view(kind) if x.getTeam() != team))
+
+	### Call whenever something in the registry changes team
+	def teamChanged(self):
+		self.snapshots = {}
+
+	def cached(self, kind, key, build):
+		snapshots = self.snapshots.setdefault(kind, {})
+		if key not in snapshots:
+			snapshots[key] = build()
+		return snapshots[key]
+
+############################
+### SpatialHash
+###
+### A uniform grid that buckets things by the cells their rects overlap.
+### Used as a collision broadphase: only things that share a cell need to be tested against each other.
+
+class SpatialHash():
+
+	### cellsize: width and height of each grid cell
+	### cells: dictionary mapping (column, row) to the list of things whose rects overlap that cell
+	### order: dictionary mapping each thing to the order in which it was inserted
+
+	def __init__(self, cellsize = COLLISIONGRIDSIZE):
+		self.cellsize = cellsize
+		self.cells = {}
+		self.order = {}
+
+	def clear(self):
+		self.cells = {}
+		self.order = {}
+
+	### Returns the first and last (column, row) overlapped by the rect
+	def cellRange(self, rect):
+		size = self.cellsize
+		return (int(rect.left // size), int(rect.top // size)), (int(rect.right // size), int(rect.bottom // size))
+
+	def insert(self, thing, rect):
+		self.order[thing] = len(self.order)
+		first, last = self.cellRange(rect)
+		for x in xrange(first[0], last[0]+1):
+			for y in xrange(first[1], last[1]+1):
+				cell = self.cells.get((x, y))
+				if cell is None:
+					self.cells[(x, y)] = [thing]
+				else:
+					cell.append(thing)
+
+	### Returns the things that share at least one cell with the rect, in the order they were inserted
+	def query(self, rect):
+		found = set()
+		first, last = self.cellRange(rect)
+		for x in xrange(first[0], last[0]+1):
+			for y in xrange(first[1], last[1]+1):
+				cell = self.cells.get((x, y))
+				if cell is not None:
+					found.update(cell)
+		return sorted(found, key = self.order.get)
+
+############################
+### SegmentGrid
+###
+### A uniform grid that buckets line segments by the cells they pass through.
+### Lines that can't move (e.g., obstacle edges) only need to be put into the grid once. After that, finding the lines near a rect, point, or segment only touches the cells it overlaps.
+### Lines that come and go (e.g., gates) can be removed again.
+
+class SegmentGrid():
+
+	### cellsize: width and height of each grid cell
+	### cells: dictionary mapping (column, row) to the list of (line, owner) entries passing through that cell
+	### order: dictionary mapping each (line, owner) entry to the order in which it was inserted
+	### count: the number of entries inserted so far
+
+	def __init__(self, cellsize = COLLISIONGRIDSIZE):
+		self.cellsize = cellsize
+		self.cells = {}
+		self.order = {}
+		self.count = 0
+
+	### Returns the (column, row) of every cell the line passes through.
+	### Cells are padded by a pixel so that intersections computed with floating point error at a cell border are not missed.
+	### Walks the columns the line spans, and takes the rows the line covers within each column, so only cells along the line are visited.
+	def lineCells(self, line):
+		size = float(self.cellsize)
+		(x1, y1), (x2, y2) = line
+		if x1 > x2:
+			x1, y1, x2, y2 = x2, y2, x1, y1
+		cells = []
+		for x in xrange(int(math.ceil((x1 - 1) / size - EPSILON)) - 1, int(math.floor((x2 + 1) / size + EPSILON)) + 1):
+			# The part of the line inside this (padded) column
+			left = max(x1, x*size - 1)
+			right = min(x2, (x+1)*size + 1)
+			if x1 == x2:
+				top, bottom = min(y1, y2), max(y1, y2)
+			else:
+				slope = (y2 - y1) / float(x2 - x1)
+				top, bottom = y1 + (left - x1)*slope, y1 + (right - x1)*slope
+				if top > bottom:
+					top, bottom = bottom, top
+			for y in xrange(int(math.ceil((top - 1) / size - EPSILON)) - 1, int(math.floor((bottom + 1) / size + EPSILON)) + 1):
+				cells.append((x, y))
+		return cells
+
+	### owner: the thing the line belongs to (e.g., an Obstacle)
+	def insert(self, line, owner = None):
+		entry = (line, owner)
+		self.order[entry] = self.count
+		self.count = self.count + 1
+		for key in self.lineCells(line):
+			cell = self.cells.get(key)
+			if cell is None:
+				self.cells[key] = [entry]
+			else:
+				cell.append(entry)
+
+	### Take out a line that was inserted with the same owner
+	def remove(self, line, owner = None):
+		entry = (line, owner)
+		if entry in self.order:
+			del self.order[entry]
+			for key in self.lineCells(line):
+				cell = self.cells.get(key)
+				if cell is not None and entry in cell:
+					cell.remove(entry)
+					if len(cell) == 0:
+						del self.cells[key]
+
+	### Returns the set of (line, owner) entries that pass through any cell overlapped by the rect.
+	### Any line that touches the rect is guaranteed to be in the set.
+	def queryRect(self, rect):
+		size = self.cellsize
+		found = set()
+		for x in xrange(int(rect.left // size), int(rect.right // size) + 1):
+			for y in xrange(int(rect.top // size), int(rect.bottom // size) + 1):
+				cell = self.cells.get((x, y))
+				if cell is not None:
+					found.update(cell)
+		return found
+
+	### Returns the set of (line, owner) entries that pass through the cell the point is in.
+	### Any line that touches the point is guaranteed to be in the set.
+	def queryPoint(self, point):
+		cell = self.cells.get((int(point[0] // self.cellsize), int(point[1] // self.cellsize)))
+		if cell is None:
+			return set()
+		return set(cell)
+
+	### Returns the set of (line, owner) entries that pass through any cell the segment from p1 to p2 passes through.
+	### Any line that touches the segment is guaranteed to be in the set.
+	def querySegment(self, p1, p2):
+		found = set()
+		for key in self.lineCells((p1, p2)):
+			cell = self.cells.get(key)
+			if cell is not None:
+				found.update(cell)
+		return found
+
+	### Returns the set of (line, owner) entries that pass through any cell within radius of a cell the segment from p1 to p2 passes through.
+	### Any line that comes within radius of the segment is guaranteed to be in the set.
+	def queryCapsule(self, p1, p2, radius):
+		reach = int(math.ceil(radius / float(self.cellsize)))
+		keys = set()
+		for x, y in self.lineCells((p1, p2)):
+			for dx in xrange(-reach, reach + 1):
+				for dy in xrange(-reach, reach + 1):
+					keys.add((x + dx, y + dy))
+		found = set()
+		for key in keys:
+			cell = self.cells.get(key)
+			if cell is not None:
+				found.update(cell)
+		return found
+
+	### Returns the lines near the segment from p1 to p2, in the order they were inserted
+	def linesNearSegment(self, p1, p2):
+		return [l for l, o in sorted(self.querySegment(p1, p2), key = self.order.get)]
+
+	### Same as capsuleClear(p1, p2, radius, lines, escaping) on every line in the grid, but only tests the lines in the cells within radius of p1 to p2
+	def capsuleClear(self, p1, p2, radius, escaping = False):
+		return capsuleClear(p1, p2, radius, [l for l, o in self.queryCapsule(p1, p2, radius)], escaping)
+
+	### Same as rayTraceWorld(p1, p2, lines) on every line in the grid (in the order they were inserted), but only tests the lines in the cells that p1 to p2 passes through.
+	def rayTrace(self, p1, p2):
+		return rayTraceWorld(p1, p2, self.linesNearSegment(p1, p2))
+
+	### Same as rayTraceWorldNoEndPoints(p1, p2, lines) on every line in the grid, but only tests the lines in the cells that p1 to p2 passes through.
+	def rayTraceNoEndPoints(self, p1, p2):
+		return rayTraceWorldNoEndPoints(p1, p2, self.linesNearSegment(p1, p2))
+
+############################
+### LineOfSightCache
+###
+### Remembers whether there is line of sight between two places, so that towers, bases, and getVisible don't trace the same ray tick after tick.
+### Both ends are snapped to a grid, and the answer for a pair of cells is worked out once, from the center of one cell to the center of the other.
+### The answer is the same whichever end is asked about first. When the world's geometry changes, everything remembered is thrown away.
+### The least recently used pairs are dropped when there are too many (see GenerationalCache).
+
+class LineOfSightCache(GenerationalCache):
+
+	### resolution: the size (pixels) of the grid cells that ends are snapped to
+
+	def __init__(self, resolution = LOSRESOLUTION, capacity = LOSCACHESIZE):
+		GenerationalCache.__init__(self, capacity)
+		self.resolution = resolution
+
+	### Returns True if there is line of sight from p1 to p2.
+	### version: the current geometry version
+	### trace: trace(p1, p2) returns None if nothing is hit between p1 and p2 (e.g., GameWorld.rayTrace)
+	def lookup(self, p1, p2, version, trace):
+		r = self.resolution
+		c1 = (int(p1[0] // r), int(p1[1] // r))
+		c2 = (int(p2[0] // r), int(p2[1] // r))
+		key = (c1, c2) if c1 <= c2 else (c2, c1)
+		return self.get(key, version, lambda: trace(((key[0][0] + 0.5) * r, (key[0][1] + 0.5) * r), ((key[1][0] + 0.5) * r, (key[1][1] + 0.5) * r)) is None)
+
+	def report(self):
+		return "Line of sight cache: %d lookups, %d hits (%.1f%%), %d pairs remembered, %d pixel grid" % (self.hits + self.misses, self.hits, self.hitRate() * 100.0, self.size(), self.resolution)
+
+############################
+### TickProfiler
+###
+### Times the parts of each tick (events, collisions, bullets, sprite updates by mover class, navigators, drawing) and keeps the last window ticks of each,
+### so that percentiles can be reported while the game is running. Times are totals per tick: a section that is entered several times in one tick (e.g., navigator) is summed.
+### Sections nest: navigator time is also counted in the sprites time of the agent that called it, and everything is counted in tick.
+
+class TickProfiler():
+
+	### window: the number of most recent ticks that statistics are computed over
+	### samples: dictionary mapping section name to a deque of the time (seconds) spent in that section on each recent tick
+	### current: dictionary mapping section name to the time spent in that section so far on this tick
+	### ticks: the number of ticks recorded
+
+	def __init__(self, window = PROFILEWINDOW):
+		self.window = window
+		self.samples = {}
+		self.current = {}
+		self.ticks = 0
+
+	### Add time (seconds) to a section for this tick
+	def add(self, name, seconds):
+		self.current[name] = self.current.get(name, 0.0) + seconds
+
+	### Call fn(*args), adding the time it takes to the section. Returns whatever fn returns.
+	def timed(self, name, fn, *args):
+		start = time.time()
+		try:
+			return fn(*args)
+		finally:
+			self.add(name, time.time() - start)
+
+	### Close off the current tick. Sections that weren't entered this tick get 0.
+	def endTick(self):
+		for name in self.current:
+			if name not in self.samples:
+				# Didn't happen on any of the earlier ticks either
+				self.samples[name] = deque([0.0] * min(self.ticks, self.window), self.window)
+		for name, samples in self.samples.iteritems():
+			samples.append(self.current.get(name, 0.0))
+		self.current = {}
+		self.ticks = self.ticks + 1
+
+	### Returns the given percentiles (0-100) of the time (seconds) spent in a section per tick over the window
+	def percentiles(self, name, ps = (50, 90, 99)):
+		if name not in self.samples or len(self.samples[name]) == 0:
+			return [0.0 for p in ps]
+		return list(numpy.percentile(numpy.array(self.samples[name]), ps))
+
+	### Returns a table of milliseconds per tick for every section, slowest (on average) first
+	def report(self):
+		lines = ["Profile of the last " + str(min(self.ticks, self.window)) + " of " + str(self.ticks) + " ticks (ms per tick)"]
+		lines.append("%-32s %9s %9s %9s %9s %9s" % ("section", "mean", "p50", "p90", "p99", "max"))
+		rows = []
+		for name, samples in self.samples.iteritems():
+			values = numpy.array(samples) * 1000.0
+			rows.append((values.mean(), name, numpy.percentile(values, (50, 90, 99)), values.max()))
+		rows.sort(reverse = True)
+		for mean, name, ps, worst in rows:
+			lines.append("%-32s %9.3f %9.3f %9.3f %9.3f %9.3f" % (name, mean, ps[0], ps[1], ps[2], worst))
+		return "\n".join(lines)
+
+	def dump(self):
+		print self.report()
 
 ############################
 ### GameWorld
@@ -798,37 +1401,59 @@ class GameWorld():
 	### agent: the player agent
 	### obstacles: obstacles
 	### sprites: all sprites (player and NPCs)
+	### entities: registry of all the movers, by kind ("agent", "npc", "bullet", "resource", ...). npcs, bullets, resources, and movers are its live views.
 	### npcs: the NPC agents
 	### dimensions: the size of the world (width, height)
 	### points: all the points of obstacles, plus screen corners
 	### lines: all the points of obstacles, plus screen edges
 	### bullets: all the bullets active
+	### bulletSprites: sprite group for drawing the bullets. Bullets are updated by the world (updateBullets), not through the sprite group.
+	### bulletPool: dictionary mapping bullet class to deleted bullets of that class, waiting to be reused
 	### resources: all the resources
 	### movers: all things that can collide with other things and implement collision()
 	### destinations: places that are not inside of obstacles. 
+	### collisionGrid: spatial hash of the movers, rebuilt every collision test
+	### obstacleGrid: segment grid of the obstacle lines, built once when the terrain is initialized
+	### obstacleLineArray: the obstacle lines packed into an (L, 4) array (x1, y1, x2, y2), for sweeping bullets
+	### obstacleLineOwners: the obstacle each row of obstacleLineArray belongs to
+	### vertexIndex: dictionary mapping each obstacle point to a list of (obstacle number, where the point is in that obstacle's points), one for each obstacle it belongs to
+	### geometryVersion: goes up by one every time the lines or points of the world change (terrain is made, gates switch)
+	### geometryCache: dictionary of snapshots of the lines and points (see getLines), good until geometryVersion changes
+	### lineGrid: segment grid of all the lines from getLines() (obstacles, screen edges, and gates), so that a ray only has to be tested against the lines near it (see rayTrace)
 	### clock: elapsed time in game
-
-	def __init__(self, seed, worlddimensions, screendimensions):
+	### ticks: number of ticks simulated so far
+	### tickDelta: the fixed amount of time (ms) each tick pretends to take when the world is stepped rather than run against the clock
+	### headless: no display or surfaces are created, nothing is drawn, and ticks are not throttled to TICK
+	### profiler: TickProfiler timing each part of every tick, or None when profiling is off (see enableProfiling)
+	### losCache: LineOfSightCache answering lineOfSight()
+	### pathCaches: the PathCaches made by makePathCache, so that dumpProfile can report on them
+
+	def __init__(self, seed, worlddimensions, screendimensions, headless = False):
 		#initialize random seed
 		self.time = time.time()
 		corerandom.seed(seed or self.time)
 		random.seed(self.time)
-		#initialize pygame and set up screen and background surface
-		pygame.init()
-		screen = pygame.display.set_mode(screendimensions)
-		# Background surface that will hold everything
-#		background = pygame.Surface(screen.get_size())
-		background = pygame.Surface(worlddimensions)
-		background = background.convert()
-		background.fill((255, 255, 255))
-		# Debug surface
-		debug = pygame.Surface(worlddimensions)
-		debug = debug.convert()
-		debug.fill((255, 255, 255))
-		background.blit(debug, (0, 0))
-		screen.blit(background, (0, 0))
-		pygame.display.flip()
+		screen = None
+		background = None
+		debug = None
+		if not headless:
+			#initialize pygame and set up screen and background surface
+			pygame.init()
+			screen = pygame.display.set_mode(screendimensions)
+			# Background surface that will hold everything
+#			background = pygame.Surface(screen.get_size())
+			background = pygame.Surface(worlddimensions)
+			background = background.convert()
+			background.fill((255, 255, 255))
+			# Debug surface
+			debug = pygame.Surface(worlddimensions)
+			debug = debug.convert()
+			debug.fill((255, 255, 255))
+			background.blit(debug, (0, 0))
+			screen.blit(background, (0, 0))
+			pygame.display.flip()
 		#store stuff
+		self.headless = headless
 		self.screen = screen
 		self.seed = seed or self.time
 		self.background = background
@@ -836,19 +1461,64 @@ class GameWorld():
 		self.obstacles = None
 		self.sprites = None
 		self.agent = None
-		self.npcs = []
+		self.entities = EntityRegistry()
+		self.npcs = self.entities.view("npc")
 		self.dimensions = worlddimensions
 		self.points = None 
 		self.lines = None 
-		self.bullets = []
-		self.resources = []
+		self.bullets = self.entities.view("bullet")
+		self.bulletSprites = pygame.sprite.RenderPlain()
+		self.bulletPool = {}
+		self.resources = self.entities.view("resource")
 		self.debugging = False
-		self.movers = []
+		self.movers = self.entities.all
 		self.clock = 0
+		self.ticks = 0
+		self.tickDelta = 1000/TICK
 		# camera
 		self.camera = [0, 0]
 		# unobstructed places
 		self.destinations = {}
+		self.collisionGrid = SpatialHash()
+		self.obstacleGrid = None
+		self.obstacleLineArray = numpy.zeros((0, 4))
+		self.obstacleLineOwners = []
+		self.vertexIndex = {}
+		self.geometryVersion = 0
+		self.geometryCache = {}
+		self.lineGrid = SegmentGrid()
+		self.profiler = None
+		self.losCache = LineOfSightCache()
+		self.pathCaches = []
+
+	### Start timing every tick. The profile is printed when 'p' is pressed, and when the program exits if dumpAtExit is True.
+	### window: the number of most recent ticks that percentiles are computed over
+	def enableProfiling(self, window = PROFILEWINDOW, dumpAtExit = True):
+		if self.profiler is None:
+			self.profiler = TickProfiler(window)
+			if dumpAtExit:
+				atexit.register(self.dumpProfile)
+		return self.profiler
+
+	### Print the profile, and how well the line of sight cache and the navigators' path caches are doing
+	def dumpProfile(self):
+		if self.profiler is not None:
+			self.profiler.dump()
+		print self.losCache.report()
+		for cache in self.pathCaches:
+			print cache.report()
+
+	### Returns a new PathCache for a navigator to share with its clones. Use this instead of calling PathCache directly, so that dumpProfile reports on it.
+	def makePathCache(self):
+		cache = PathCache()
+		self.pathCaches.append(cache)
+		return cache
+
+	### Call fn(*args) and return what it returns. When profiling, the time it takes is added to the named section of the current tick.
+	def timed(self, name, fn, *args):
+		if self.profiler is None:
+			return fn(*args)
+		return self.profiler.timed(name, fn, *args)
 	
 	def getPoints(self):
 		return self.points
@@ -856,17 +1526,26 @@ class GameWorld():
 	def getLines(self):
 		return self.lines
 	
+	### Returns a Snapshot of the lines that aren't screen edges. The same snapshot is returned until the geometry changes.
 	def getLinesWithoutBorders(self):
+		return self.cachedGeometry("linesWithoutBorders", self.collectLinesWithoutBorders)
+
+	def collectLinesWithoutBorders(self):
 		corners = [(0, 0), (self.dimensions[0], 0), (self.dimensions[0], self.dimensions[1]), (0, self.dimensions[1])]
 		lines = []
 		for l in self.getLines():
 			if not (l[0] in corners and l[1] in corners):
 				lines.append(l)
-		return lines
+		return Snapshot(lines)
 
 	
 	def getObstacles(self):
 		return self.obstacles
+
+	### Are p1 and p2 both points of the same obstacle?
+	def sameObstacle(self, p1, p2):
+		owners = [n for n, i in self.vertexIndex.get(p1, ())]
+		return any(n in owners for n, i in self.vertexIndex.get(p2, ()))
 	
 	def getDimensions(self):
 		return self.dimensions
@@ -874,7 +1553,7 @@ class GameWorld():
 	def setPlayerAgent(self, agent):
 		self.agent = agent
 		self.camera = agent.getLocation()
-		self.movers.append(agent)
+		self.entities.add(agent, "agent")
 #		print agent.radius
 
 	# Make Random Terrain
@@ -892,13 +1571,14 @@ class GameWorld():
 						tooclose = True
 				if tooclose == False:
 					break
-			o = RandomObstacle(onum, pos, radius, sigma, min)
+			o = RandomObstacle(onum, pos, radius, sigma, min, headless = self.headless)
 			obstacles.append(o)
 			points = points + o.getPoints()
 			lines = lines + o.getLines()
 		self.obstacles = obstacles
 		self.points = points
 		self.lines = lines 
+		self.initializeObstacleGrid()
 		
 	# Make Terrain
 	# polys = list of list points (poly1, poly2, ...) = ((p11, p12, ...), (p21, p22, ...), ...)
@@ -911,13 +1591,48 @@ class GameWorld():
 			#maxpt = (max(map(lambda p: p[0], poly)), max(map(lambda p: p[1], poly)))
 			#center = [ (sum(map(lambda p: p[0], poly))/float(len(poly)))-((maxpt[0]-minpt[0])/2.0), (sum(map(lambda p: p[1], poly))/float(len(poly)))-((maxpt[1]-minpt[1])/2.0) ]
 			#newpoly = map(lambda pt: (pt[0] - minpt[0], pt[1] - minpt[1]), poly)
-			o = ManualObstacle(poly, color, linewidth, sprite)
+			o = ManualObstacle(poly, color, linewidth, sprite, self.headless)
 			points = points + o.getPoints()
 			lines = lines + o.getLines()
 			obstacles.append(o)
 		self.obstacles = obstacles
 		self.points = points
 		self.lines = lines
+		self.initializeObstacleGrid()
+
+	# Obstacles never move, so their lines are bucketed once for collision testing, packed into arrays once for bullets, and their points are indexed once
+	def initializeObstacleGrid(self):
+		self.obstacleGrid = SegmentGrid()
+		owners = []
+		for o in self.obstacles:
+			for l in o.getLines():
+				self.obstacleGrid.insert(l, o)
+				owners.append(o)
+		self.obstacleLineArray = numpy.vstack([numpy.zeros((0, 4))] + [o.getLineArray() for o in self.obstacles])
+		self.obstacleLineOwners = owners
+		self.vertexIndex = {}
+		for n, o in enumerate(self.obstacles):
+			for p, i in o.pointIndex.iteritems():
+				self.vertexIndex.setdefault(p, []).append((n, i))
+		self.lineGrid = SegmentGrid()
+		for l in self.lines:
+			self.lineGrid.insert(l)
+		self.geometryChanged()
+
+	### Call whenever lines or points are added to or removed from the world, so that snapshots are rebuilt
+	def geometryChanged(self):
+		self.geometryVersion = self.geometryVersion + 1
+		self.geometryCache = {}
+
+	### Returns a number that changes whenever the lines or points of the world change. Anything computed from the lines can be cached until it changes.
+	def getGeometryVersion(self):
+		return self.geometryVersion
+
+	### Returns cached[key], making it with build() if it hasn't been made since the geometry last changed
+	def cachedGeometry(self, key, build):
+		if key not in self.geometryCache:
+			self.geometryCache[key] = build()
+		return self.geometryCache[key]
 
 
 	def initializeResources(self, points, resource = RESOURCE):
@@ -933,7 +1648,7 @@ class GameWorld():
 				pos = (corerandom.randint(0, self.dimensions[0]), corerandom.randint(0, self.dimensions[1]))
 				inside = False
 				for o in self.obstacles:
-					if pointInsidePolygonPoints(pos, o.getPoints()):
+					if o.pointInside(pos):
 						inside = True
 				if inside == False:
 					break
@@ -942,37 +1657,86 @@ class GameWorld():
 #			self.resources.add(r)
 #			self.movers.add(r)
 
+	### Set up the sprite group that drives mover updates. Only needs to happen once, before the first tick.
+	def initializeSprites(self):
+		if self.sprites is None:
+			self.sprites = pygame.sprite.RenderPlain((self.agent))
+#			for r in self.resources:
+#				self.sprites.add(r)
+#			for n in self.npcs:
+#				self.sprites.add(n)
+			for m in self.movers:
+				if m not in self.bullets:
+					self.sprites.add(m)
+			# Draw obstacles. Only need to do this once
+			if not self.headless:
+				for o in self.obstacles:
+					o.draw(self.background)
+
 	def run(self):
-		self.sprites = pygame.sprite.RenderPlain((self.agent))
-#		for r in self.resources:
-#			self.sprites.add(r)
-#		for n in self.npcs:
-#			self.sprites.add(n)
-		for m in self.movers:
-			self.sprites.add(m)
+		self.initializeSprites()
 		clock = pygame.time.Clock()
-		
-		# Draw obstacles. Only need to do this once
-		for o in self.obstacles:
-			o.draw(self.background)
 
-		t = 0
 		while True:
-			clock.tick(TICK)
-			delta = clock.get_rawtime()
-			self.handleEvents()
-			self.update(delta)
+			if self.headless:
+				# No display to keep up with: run as fast as possible
+				delta = self.tickDelta
+			else:
+				clock.tick(TICK)
+				delta = clock.get_rawtime()
+				self.timed("events", self.handleEvents)
+			self.tick(delta)
+			if self.ticks % 100 == 0:
+				print "Ticks: ", self.ticks
+
+	### Advance the world by one tick
+	### delta: time passed since last tick
+	def tick(self, delta):
+		start = time.time()
+		self.timed("update", self.update, delta)
+		self.timed("bullets", self.updateBullets, delta)
+		if self.profiler is None:
 			self.sprites.update(delta) 
-			#print "obstacles"
-			#for o in self.obstacles:
-			#	print o.pos
-			#	o.pos[0] = o.pos[0] + 1.0
-			#	o.pos[1] = o.pos[1] + 1.0
-			self.drawWorld()
-			pygame.display.flip()
-			t += 1
-			if t % 100 == 0:
-				print "Ticks: ", t
+		else:
+			# Same as sprites.update, but timed by mover class
+			for s in self.sprites.sprites():
+				self.profiler.timed("sprites." + s.__class__.__name__, s.update, delta)
+		#print "obstacles"
+		#for o in self.obstacles:
+		#	print o.pos
+		#	o.pos[0] = o.pos[0] + 1.0
+		#	o.pos[1] = o.pos[1] + 1.0
+		if not self.headless:
+			self.timed("draw", self.drawWorld)
+			self.timed("flip", pygame.display.flip)
+		self.ticks = self.ticks + 1
+		if self.profiler is not None:
+			self.profiler.add("tick", time.time() - start)
+			self.profiler.endTick()
+
+	### Advance the world by n ticks and return control to the caller. Each tick takes tickDelta, regardless of how long it really took.
+	### Returns the total number of ticks simulated so far.
+	def step(self, n = 1):
+		self.initializeSprites()
+		for _ in xrange(n):
+			if not self.headless:
+				# Keep the window responsive without handing control to the user
+				pygame.event.pump()
+			self.tick(self.tickDelta)
+		return self.ticks
+
+	### Step the world until predicate(world) is True, or until maxTicks more ticks have been simulated (None means no limit).
+	### The predicate is checked before every tick, so no ticks are wasted once it holds.
+	### Returns True if the predicate was satisfied, False if maxTicks ran out first.
+	def runUntil(self, predicate, maxTicks = None):
+		self.initializeSprites()
+		count = 0
+		while not predicate(self):
+			if maxTicks is not None and count >= maxTicks:
+				return False
+			self.step()
+			count = count + 1
+		return True
 			
 	def drawWorld(self):
 		#self.screen.blit(self.background, (0, 0))
@@ -983,6 +1747,7 @@ class GameWorld():
 		if self.debugging:
 			self.background.blit(self.debug, (0, 0))
 		self.sprites.draw(self.background)
+		self.bulletSprites.draw(self.background)
 		for o in self.obstacles:
 			o.draw(self.background)
 		#pygame.display.flip()
@@ -1009,31 +1774,48 @@ class GameWorld():
 			self.agent.shoot()
 		elif key == 100: #d
 			print "distance traveled", self.agent.distanceTraveled
+		elif key == 112: #p
+			self.dumpProfile()
 
 	def worldCollisionTest(self):
 		collisions = []
+		# Broadphase: bucket the movers so that each mover is only tested against movers near it
+		self.collisionGrid.clear()
+		for m in self.movers:
+			self.collisionGrid.insert(m, m.rect)
+		pairs = set()
 		for m1 in self.movers:
-			if m1 in self.movers:
-				# Collision against world boundaries
-				if m1.position[0] < 0 or m1.position[0] > self.dimensions[0] or m1.position[1] < 0 or m1.position[1] > self.dimensions[1]:
-					collisions.append((m1, self))
-				# Collision against obstacles
+			# Collision against world boundaries
+			if m1.position[0] < 0 or m1.position[0] > self.dimensions[0] or m1.position[1] < 0 or m1.position[1] > self.dimensions[1]:
+				collisions.append((m1, self))
+			# Collision against obstacles. Only lines passing through the cells the mover overlaps can touch it, and most movers aren't near any.
+			nearby = {}
+			for l, o in self.obstacleGrid.queryRect(m1.rect):
+				if o in nearby:
+					nearby[o].append(l)
+				else:
+					nearby[o] = [l]
+			if len(nearby) > 0:
+				rect = m1.rect
 				for o in self.obstacles:
-					c = False
-					for l in o.getLines():
-						for r in ((m1.rect.topleft, m1.rect.topright), (m1.rect.topright, m1.rect.bottomright), (m1.rect.bottomright, m1.rect.bottomleft), (m1.rect.bottomleft, m1.rect.topleft)):
-							hit = calculateIntersectPoint(l[0], l[1], r[0], r[1])
-							if hit is not None:
-								c = True
-					if c:
-						collisions.append((m1, o))
-				# Movers against movers
-				for m2 in self.movers:
-					if m2 in self.movers:
-						if m1 != m2:
-							if (m1, m2) not in collisions and (m2, m1) not in collisions:
-								if m1.rect.colliderect(m2.rect):
-									collisions.append((m1, m2))
+					if o in nearby:
+						box = o.getBoundingBox()
+						if rect.right < box[0][0] or rect.left > box[1][0] or rect.bottom < box[0][1] or rect.top > box[1][1]:
+							continue
+						c = False
+						for l in nearby[o]:
+							for r in ((rect.topleft, rect.topright), (rect.topright, rect.bottomright), (rect.bottomright, rect.bottomleft), (rect.bottomleft, rect.topleft)):
+								hit = calculateIntersectPoint(l[0], l[1], r[0], r[1])
+								if hit is not None:
+									c = True
+						if c:
+							collisions.append((m1, o))
+			# Movers against nearby movers
+			for m2 in self.collisionGrid.query(m1.rect):
+				if m1 != m2 and (m2, m1) not in pairs:
+					if m1.rect.colliderect(m2.rect):
+						pairs.add((m1, m2))
+						collisions.append((m1, m2))
 		for c in collisions:
 			c[0].collision(c[1])
 			c[1].collision(c[0])
@@ -1046,49 +1828,158 @@ class GameWorld():
 	def collision(self, thing):
 		return None
 		
+	### Returns a Snapshot of the lines. The same snapshot is returned until the geometry changes (see getGeometryVersion).
 	def getLines(self):
-		return self.lines[:]
+		return self.cachedGeometry("lines", lambda: Snapshot(self.collectLines()))
+
+	### Returns a new list of all the lines. Subclasses that add lines extend this.
+	def collectLines(self):
+		return list(self.lines)
+
+	### Returns the lines from getLines() packed into an (N, 4) array. rayTraceWorld is faster with this than with the list.
+	def getLineArray(self):
+		return self.cachedGeometry("lineArray", lambda: packLines(self.getLines()))
+
+	def getLineGrid(self):
+		return self.lineGrid
+
+	### Same as rayTraceWorld(p1, p2, self.getLines()), but only tests the lines near p1 to p2
+	def rayTrace(self, p1, p2):
+		return self.lineGrid.rayTrace(p1, p2)
+
+	### Same as capsuleClear(p1, p2, radius, self.getLines(), escaping), but only tests the lines near p1 to p2
+	def capsuleClear(self, p1, p2, radius, escaping = False):
+		return self.lineGrid.capsuleClear(p1, p2, radius, escaping)
+
+	### Returns the visibility graph of the points from getPoints(): a dictionary mapping each point to the set of points it can see.
+	### p1 can see p2 if rayTraceWorldNoEndPoints(p1, p2, self.getLines()) is None. Built once, until the geometry changes.
+	def getVisibilityGraph(self):
+		return self.cachedGeometry("visibilityGraph", self.buildVisibilityGraph)
+
+	def buildVisibilityGraph(self):
+		points = self.getPoints()
+		visible = visibilityMatrix(points, self.getLineArray())
+		graph = {}
+		for i, p in enumerate(points):
+			graph.setdefault(p, set()).update(points[j] for j in numpy.flatnonzero(visible[i]))
+		return graph
+
+	### Returns a bytearray with an entry per edge of a PathGraph: 1 if the edge can't be walked right now, or None if every edge can be walked.
+	### Nothing blocks path edges in a plain world.
+	def getBlockedEdges(self, graph):
+		return None
 
+	### Returns True if nothing blocks the way from p1 to p2. Answers are remembered by losCache, so this is approximate to within the cache's resolution.
+	def lineOfSight(self, p1, p2):
+		return self.losCache.lookup(p1, p2, self.geometryVersion, self.rayTrace)
+
+	### Same as rayTraceWorldNoEndPoints(p1, p2, self.getLines()), but only tests the lines near p1 to p2
+	def rayTraceNoEndPoints(self, p1, p2):
+		return self.lineGrid.rayTraceNoEndPoints(p1, p2)
+
+	### Returns a Snapshot of the points. The same snapshot is returned until the geometry changes.
 	def getPoints(self):
-		return self.points[:]
+		return self.cachedGeometry("points", lambda: Snapshot(self.points))
 		
+	### Returns a new bullet of the given class, reusing a deleted one if there is one.
+	### Use this instead of calling the bullet class directly, so that shooting doesn't allocate a new bullet every time.
+	def makeBullet(self, bulletclass, position, orientation):
+		pool = self.bulletPool.get(bulletclass)
+		if pool:
+			bullet = pool.pop()
+			# Run the constructor again to put the bullet back into its initial state
+			bullet.__init__(position, orientation, self)
+			return bullet
+		return bulletclass(position, orientation, self)
+
 	def addBullet(self, bullet):
-		self.bullets.append(bullet)
-		if self.sprites is not None:
-			self.sprites.add(bullet)
-		self.movers.append(bullet)
+		self.entities.add(bullet, "bullet")
+		self.bulletSprites.add(bullet)
+
+	### Move every bullet one tick.
+	### Bullets that just fly straight are moved all at once with arrays. Their path for this tick is swept against obstacle lines, gates, and other movers, 
+	### so a fast bullet can't skip over a thin obstacle line (or a mover) between two collision tests. 
+	### Things the path runs into get collision callbacks in the order they are reached, until one of them stops the bullet.
+	def updateBullets(self, delta):
+		batched = []
+		for b in list(self.bullets):
+			# Bullets that don't override update() just fly straight, so they can be moved all at once. The rest move themselves.
+			if type(b).update.im_func is Bullet.update.im_func:
+				batched.append(b)
+			else:
+				b.update(delta)
+		if len(batched) == 0:
+			return None
+		starts = numpy.array([b.position for b in batched], dtype = float)
+		angles = numpy.radians(numpy.array([b.orientation for b in batched], dtype = float))
+		speeds = numpy.array([b.speed for b in batched], dtype = float)
+		steps = numpy.column_stack((numpy.cos(angles) * speeds[:, 0], -numpy.sin(angles) * speeds[:, 1]))
+		lengths = numpy.hypot(steps[:, 0], steps[:, 1])
+		# Lines that stop bullets
+		lines, lineOwners = self.getBulletBlockers()
+		lineHits = sweepPointsAgainstLines(starts, steps, lines)
+		# Movers that bullets can hit, approximated by the circle that fits inside their rects
+		targets = [m for m in self.movers if m not in self.bullets]
+		centers = numpy.array([m.rect.center for m in targets], dtype = float).reshape(-1, 2)
+		radii = numpy.array([min(m.rect.width, m.rect.height) / 2.0 for m in targets], dtype = float)
+		targetHits = sweepPointsAgainstCircles(starts, steps, centers, radii)
+		for i, b in enumerate(batched):
+			if b not in self.bullets:
+				# Deleted by something earlier in the batch
+				continue
+			step = steps[i]
+			b.distanceTraveled = b.distanceTraveled + lengths[i]
+			events = [(lineHits[i][j], lineOwners[j]) for j in numpy.flatnonzero(lineHits[i] <= 1.0)]
+			events = events + [(targetHits[i][j], targets[j]) for j in numpy.flatnonzero(targetHits[i] <= 1.0)]
+			events.sort(key = lambda e: e[0])
+			stop = 1.0
+			for t, thing in events:
+				if isinstance(thing, Mover) and thing not in self.movers:
+					continue
+				b.collision(thing)
+				thing.collision(b)
+				if b not in self.bullets:
+					stop = t
+					break
+			b.move((float(step[0] * stop), float(step[1] * stop)))
+			if b in self.bullets:
+				b.checkRange()
+		return None
+
+	### Returns the lines that stop bullets as an (L, 4) array, and the thing each line belongs to
+	def getBulletBlockers(self):
+		return self.obstacleLineArray, self.obstacleLineOwners
 		
 	def deleteBullet(self, bullet):
 		if bullet in self.bullets:
-			self.bullets.remove(bullet)
-			if self.sprites is not None:
-				self.sprites.remove(bullet)
-			self.movers.remove(bullet)
+			self.entities.remove(bullet, "bullet")
+			self.bulletSprites.remove(bullet)
+			# Keep the bullet around for the next shot
+			if type(bullet) in self.bulletPool:
+				self.bulletPool[type(bullet)].append(bullet)
+			else:
+				self.bulletPool[type(bullet)] = [bullet]
 
 	def addResource(self, res):
-		self.resources.append(res)
+		self.entities.add(res, "resource")
 		if self.sprites is not None:
 			self.sprites.add(res)
-		self.movers.append(res)
 	
 	def deleteResource(self, res):
-		self.resources.remove(res)
+		self.entities.remove(res, "resource")
 		if self.sprites is not None:
 			self.sprites.remove(res)
-		self.movers.remove(res)
 		
 	def addNPC(self, npc):
-		self.npcs.append(npc)
+		self.entities.add(npc, "npc")
 		if self.sprites is not None:
 			self.sprites.add(npc)
-		self.movers.append(npc)
 		
 	def deleteNPC(self, npc):
 		if npc in self.npcs:
-			self.npcs.remove(npc)
+			self.entities.remove(npc, "npc")
 			if self.sprites is not None:
 				self.sprites.remove(npc)
-			self.movers.remove(npc)
 
 	def getVisible(self, position, orientation, viewangle, type = None):
 		visible = []
@@ -1108,26 +1999,21 @@ class GameWorld():
 						else:
 							angle = math.degrees(math.acos(x))
 						if angle < viewangle/2.0:
-							hit = rayTraceWorld(position, other, self.getLines())
-							if hit == None:
+							if self.lineOfSight(position, other):
 								visible.append(m)
 					else:
 						# viewangle is 360
-						hit = rayTraceWorld(position, other, self.getLines())
-						if hit == None:
+						if self.lineOfSight(position, other):
 							visible.append(m)
 		return visible
 
 	def computeFreeLocations(self, agent):
 		if type(agent) not in self.destinations:
-			destinations = []
 			grid = agent.getRadius()*2.0
-			for x in xrange(1, int(self.dimensions[0]/grid)):
-				for y in xrange(1, int(self.dimensions[1]/grid)):
-					point = (x*grid, y*grid)
-					if isGood(point, self, grid):
-						destinations.append(point)
-			self.destinations[type(agent)] = destinations
+			points = [(x*grid, y*grid) for x in xrange(1, int(self.dimensions[0]/grid)) for y in xrange(1, int(self.dimensions[1]/grid))]
+			# Same as isGood() on every point, but all at once
+			good = areGood(points, self, grid)
+			self.destinations[type(agent)] = [p for p, g in zip(points, good) if g]
 		
 	def getFreeLocations(self, agent):
 		if type(agent) in self.destinations:
@@ -1187,14 +2073,16 @@ class GatedWorld(GameWorld):
 	### timer: running timer
 	### alarm: when timer is greater than this number, gate switches
 	### gate: the active gate
+	### blockedEdges: dictionary mapping each PathGraph that has asked (see getBlockedEdges) to a bytearray of the edges the active gates cross
 
-	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm):
-		GameWorld.__init__(self, seed, worlddimensions, screendimensions)
+	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless = False):
+		GameWorld.__init__(self, seed, worlddimensions, screendimensions, headless)
 		self.potentialGates = []
 		self.timer = 0
 		self.alarm = alarm
 		self.gates = []
 		self.numGates = numgates
+		self.blockedEdges = {}
 	
 	def getNumGates(self):
 		return self.numGates
@@ -1205,20 +2093,17 @@ class GatedWorld(GameWorld):
 	def makePotentialGates(self):
 		if self.obstacles != None:
 			dangerpoints = [(0, 0), (self.dimensions[0], 0), (self.dimensions[0], self.dimensions[1]), (0, self.dimensions[1])]
+			visible = self.getVisibilityGraph()
 			for p1 in self.getPoints():
 				for p2 in self.getPoints():
-					if p1 != p2: # and p2 != (0, 0) and p2 != (self.dimensions[0], 0) and p2 != (self.dimensions[0], self.dimensions[1]) and p2 != (0, self.dimensions[1]):
+					# Only points that can see each other can have a gate between them
+					if p1 != p2 and p2 in visible[p1]: # and p2 != (0, 0) and p2 != (self.dimensions[0], 0) and p2 != (self.dimensions[0], self.dimensions[1]) and p2 != (0, self.dimensions[1]):
 						if (p1 not in dangerpoints) or (p2 not in dangerpoints):
-							samepoly = False
-							for o in self.obstacles:
-								if p1 in o.getPoints() and p2 in o.getPoints():
-									samepoly = True
-							if samepoly == False:
+							if not self.sameObstacle(p1, p2):
 								if not insideObstacle(((p1[0]+p2[0])/2.0, (p1[1]+p2[1])/2.0), self.obstacles):
-									
-									hit = rayTraceWorldNoEndPoints(p1, p2, self.getLines())
-									if hit == None:
-										self.potentialGates.append((p1, p2))
+									self.potentialGates.append((p1, p2))
+			for graph in self.blockedEdges:
+				graph.maskLines(self.potentialGates)
 
 	def drawWorld(self):
 		GameWorld.drawWorld(self)
@@ -1228,9 +2113,14 @@ class GatedWorld(GameWorld):
 
 	def worldCollisionTest(self):
 		GameWorld.worldCollisionTest(self)
+		# Only movers that share a grid cell with one of the gate's decorations can be colliding with the gate
 		for g in self.gates:
-			for m in self.movers:
-				if g.isColliding(m.rect):
+			nearby = set()
+			for d in g.decorations:
+				nearby.update(self.collisionGrid.query(d.rect))
+			for m in sorted(nearby, key = self.collisionGrid.order.get):
+				# Collisions with earlier gates may have removed the mover from the world
+				if g.isColliding(m.rect) and m in self.movers:
 					m.collision(g)
 					g.collision(m)
 				
@@ -1242,27 +2132,47 @@ class GatedWorld(GameWorld):
 			self.timer = 0
 			if len(self.potentialGates) > 0:
 				newgates = []
+				locations = numpy.array([m.getLocation() for m in self.movers], dtype = float).reshape(-1, 2)
+				radii = numpy.array([m.getRadius() for m in self.movers])
 				for x in xrange(self.numGates):
 					r = corerandom.randint(0, len(self.potentialGates)-1)
 					line = self.potentialGates[r]
-					tooclose = False
-					for m in self.movers:
-						if minimumDistance(line, m.getLocation()) < m.getRadius()*4.0:
-							tooclose = True
-							break
+					# Too close if any mover is within 4 radii of the line
+					tooclose = pointsNearLines(locations, packLines([line]), radii*4.0).any()
 					if tooclose == False:
 						g = Gate(line[0], line[1], GATE, self)
 						newgates.append(g)
 					elif len(self.gates) > x:
 						newgates.append(self.gates[x])
-				self.gates = newgates
+				self.setGates(newgates)
 		return None
 
+	### Replace the active gates, keeping the line grid up to date
+	def setGates(self, gates):
+		for g in self.gates:
+			self.lineGrid.remove(g.line, g)
+		self.gates = gates
+		for g in self.gates:
+			self.lineGrid.insert(g.line, g)
+		self.geometryChanged()
+		for graph in self.blockedEdges:
+			self.blockedEdges[graph] = graph.crossedEdges(self.getGates())
+
+	### Returns a bytearray with an entry per edge of a PathGraph: 1 if the edge crosses an active gate.
+	### The first time a graph asks, the edges every potential gate crosses are worked out; after that the bytearray is rebuilt from those whenever the gates change.
+	def getBlockedEdges(self, graph):
+		blocked = self.blockedEdges.get(graph)
+		if blocked is None:
+			graph.maskLines(self.potentialGates)
+			blocked = graph.crossedEdges(self.getGates())
+			self.blockedEdges[graph] = blocked
+		return blocked
+
 
 		
 	### NOTE: really should get the bounding box and return the lines of the bounding box
-	def getLines(self):
-		lines = GameWorld.getLines(self)
+	def collectLines(self):
+		lines = GameWorld.collectLines(self)
 		for g in self.gates:
 			lines.append(g.line)
 		return lines
@@ -1275,24 +2185,32 @@ class GatedWorld(GameWorld):
 			offsetY = pos[1] + self.agent.rect.center[1] - self.camera[1]
 			self.addGateAtNearest((offsetX, offsetY))
 
+	### Gates stop bullets too
+	def getBulletBlockers(self):
+		return self.cachedGeometry("bulletBlockers", self.collectBulletBlockers)
+
+	def collectBulletBlockers(self):
+		lines, owners = GameWorld.getBulletBlockers(self)
+		if len(self.gates) > 0:
+			lines = numpy.vstack((lines, numpy.array([g.line[0] + g.line[1] for g in self.gates], dtype = float)))
+			owners = owners + self.gates
+		return lines, owners
+
 	def drawPotentialGates(self):
+		if self.debug is None:
+			return
 		for g in self.potentialGates:
 			pygame.draw.line(self.debug, (225, 225, 225), g[0], g[1], 1)
 
 
 	def addGateAtNearest(self, point):
 		if len(self.potentialGates) > 0 and self.numGates > 0:
-			bestGate = None
-			bestDist = 0
-			for cur in self.potentialGates:
-				d = minimumDistance(cur, point)
-				if bestGate is None or d < bestDist:
-					bestGate = cur
-					bestDist = d
+			bestGate = self.potentialGates[numpy.argmin(pointToLinesDistance(point, packLines(self.potentialGates)))]
 			g = Gate(bestGate[0], bestGate[1], GATE, self)
-			self.gates.append(g)
-			if len(self.gates) > self.numGates:
-				self.gates.pop(0)
+			gates = self.gates + [g]
+			if len(gates) > self.numGates:
+				gates.pop(0)
+			self.setGates(gates)
 
 #######################################
 ### HELPERS
@@ -1300,18 +2218,25 @@ class GatedWorld(GameWorld):
 
 def insideObstacle(point, obstacles):
 	for o in obstacles:
-		if pointInsidePolygonPoints(point, o.getPoints()):
+		if o.pointInside(point):
 			return True
 	return False		
 				
 def isGood(point, world, threshold):
 	if point[0] > 0 and point[0] < world.dimensions[0] and point[1] > 0 and point[1] < world.dimensions[1]:
 		for o in world.obstacles:
-			if pointInsidePolygonPoints(point, o.getPoints()):
-				return False
-		for l in world.getLines():
-			if minimumDistance(l, point) < threshold:
+			if o.pointInside(point):
 				return False
+		if anyLineWithin(point, world.getLineArray(), threshold):
+			return False
 		return True
 	return False
 
+# isGood() for a list of points. Returns an array of booleans.
+def areGood(points, world, threshold):
+	points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	good = (points[:, 0] > 0) & (points[:, 0] < world.dimensions[0]) & (points[:, 1] > 0) & (points[:, 1] < world.dimensions[1])
+	for o in world.obstacles:
+		good = good & ~o.pointsInside(points)
+	return good & ~pointsNearLines(points, world.getLineArray(), threshold)
+
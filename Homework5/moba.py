@@ -57,12 +57,6 @@ class MOBABullet(Bullet):
 		Bullet.__init__(self, position, orientation, world, image, speed, damage)
 		self.range = range
 	
-	def update(self, delta):
-		Bullet.update(self, delta)
-		if self.distanceTraveled > self.range:
-			self.speed = (0, 0)
-			self.world.deleteBullet(self)
-
 	def collision(self, thing):
 		Bullet.collision(self, thing)
 		if isinstance(thing, Base) and (thing.getTeam() == None or thing.getTeam() != self.owner.getTeam()):
@@ -216,6 +210,7 @@ class Base(Mover):
 	
 	def setTeam(self, team):
 		self.team = team
+		self.world.entities.teamChanged()
 	
 	### Spawn an agent.
 	### type: name of agent class. Must be RTSAgent or subclass thereof
@@ -258,8 +253,7 @@ class Base(Mover):
 			heros = []
 			for npc in self.world.npcs + [self.world.agent]:
 				if npc.getTeam() == None or npc.getTeam() != self.getTeam() and distance(self.getLocation(), npc.getLocation()) < BASEBULLETRANGE:
-					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getLines())
-					if hit == None:
+					if self.world.lineOfSight(self.getLocation(), npc.getLocation()):
 						if isinstance(npc, Minion):
 							minions.append(npc)
 						elif isinstance(npc, Hero):
@@ -287,7 +281,7 @@ class Base(Mover):
 
 	def shoot(self):
 		if self.canfire:
-			bullet = self.bulletclass(self.rect.center, self.orientation, self.world)
+			bullet = self.world.makeBullet(self.bulletclass, self.rect.center, self.orientation)
 			bullet.setOwner(self)
 			self.world.addBullet(bullet)
 			self.canfire = False
@@ -331,6 +325,7 @@ class Tower(Mover):
 	
 	def setTeam(self, team):
 		self.team = team
+		self.world.entities.teamChanged()
 
 
 	def damage(self, amount):
@@ -356,8 +351,7 @@ class Tower(Mover):
 			heros = []
 			for npc in self.world.npcs + [self.world.agent]:
 				if npc.getTeam() == None or npc.getTeam() != self.getTeam() and distance(self.getLocation(), npc.getLocation()) < TOWERBULLETRANGE:
-					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getLines())
-					if hit == None:
+					if self.world.lineOfSight(self.getLocation(), npc.getLocation()):
 						if isinstance(npc, Minion):
 							minions.append(npc)
 						elif isinstance(npc, Hero):
@@ -371,7 +365,7 @@ class Tower(Mover):
 
 	def shoot(self):
 		if self.canfire:
-			bullet = self.bulletclass(self.rect.center, self.orientation, self.world)
+			bullet = self.world.makeBullet(self.bulletclass, self.rect.center, self.orientation)
 			bullet.setOwner(self)
 			self.world.addBullet(bullet)
 			self.canfire = False
@@ -385,44 +379,48 @@ class Tower(Mover):
 
 class MOBAWorld(GatedWorld):
 	
-	### bases: the bases (one per team)
-	### towers: the towers (many per team)
+	### bases: the bases (one per team), a live view of the "base" entities
+	### towers: the towers (many per team), a live view of the "tower" entities
 	
-	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm):
-		GatedWorld.__init__(self, seed, worlddimensions, screendimensions, numgates, alarm)
-		self.bases = []
-		self.towers = []
+	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless = False):
+		GatedWorld.__init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless)
+		self.bases = self.entities.view("base")
+		self.towers = self.entities.view("tower")
 	
 	def addBase(self, base):
-		self.bases.append(base)
+		self.entities.add(base, "base")
 		if self.sprites is not None:
 			self.sprites.add(base)
-		self.movers.append(base)
 	
 	def deleteBase(self, base):
 		if base in self.bases:
-			self.bases.remove(base)
+			self.entities.remove(base, "base")
 			if self.sprites is not None:
 				self.sprites.remove(base)
-			self.movers.remove(base)
 	
 	
 	def addTower(self, tower):
-		self.towers.append(tower)
+		self.entities.add(tower, "tower")
 		if self.sprites is not None:
 			self.sprites.add(tower)
-		self.movers.append(tower)
 			
 	def deleteTower(self, tower):
 		if tower in self.towers:
-			self.towers.remove(tower)
+			self.entities.remove(tower, "tower")
 			if self.sprites is not None:
 				self.sprites.remove(tower)
-			self.movers.remove(tower)
+
+	### The getters below return tuples that are cached until something of that kind is added or removed, so they are cheap to call every tick.
 
 	def getBases(self):
-		return list(self.bases)
+		return self.entities.snapshot("base")
 	
+	### Returns the team of the last base standing, or None if the game hasn't been decided yet.
+	def getWinner(self):
+		if len(self.bases) == 1:
+			return self.bases[0].getTeam()
+		return None
+
 	def getBaseForTeam(self, team):
 		for b in self.bases:
 			if b.getTeam() == team:
@@ -430,41 +428,21 @@ class MOBAWorld(GatedWorld):
 		return None
 	
 	def getEnemyBases(self, myteam):
-		bases = []
-		for b in self.bases:
-			if b.getTeam() != myteam:
-				bases.append(b)
-		return bases
+		return self.entities.notForTeam("base", myteam)
 
 	def getTowers(self):
-		return list(self.towers)
+		return self.entities.snapshot("tower")
 
 	def getTowersForTeam(self, team):
-		towers = []
-		for t in self.towers:
-			if t.getTeam() == team:
-				towers.append(t)
-		return towers
+		return self.entities.forTeam("tower", team)
 
 	def getEnemyTowers(self, myteam):
-		towers = []
-		for t in self.towers:
-			if t.getTeam() != myteam:
-				towers.append(t)
-		return towers
+		return self.entities.notForTeam("tower", myteam)
 	
 	def getNPCsForTeam(self, team):
-		npcs = []
-		for x in self.getNPCs():
-			if x.getTeam() == team:
-				npcs.append(x)
-		return npcs
+		return self.entities.forTeam("npc", team)
 
 	def getEnemyNPCs(self, myteam):
-		npcs = []
-		for x in self.getNPCs():
-			if x.getTeam() != myteam:
-				npcs.append(x)
-		return npcs
+		return self.entities.notForTeam("npc", myteam)
 
 
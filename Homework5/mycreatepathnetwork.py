@@ -30,25 +30,31 @@ def myCreatePathNetwork(world, agent = None):
 	polys = []
 	### YOUR CODE GOES BELOW HERE ###
 	points = world.getPoints()
-	lines = world.getLines()
+	lines = list(world.getLines())
 	obstacles = [obstacle.getPoints() for obstacle in world.getObstacles()]
+	obstaclePolygons = [obstacle.getPolygon() for obstacle in world.getObstacles()]
 	triangleLines = []
+	visible = world.getVisibilityGraph()
+
+	# Is the way from a to b blocked by an obstacle or by a triangle made so far? The world already knows which points can see each other past the obstacles.
+	def blocked(a, b):
+		return b not in visible[a] or rayTraceWorldNoEndPoints(a, b, triangleLines) is not None
 
 	# Find triangles
 	for point0 in points:
 		for point1 in points:
 			if point1 is not point0: # and point0 not in currTriangle and point1 not in currTriangle:
-				if rayTraceWorldNoEndPoints(point0, point1, lines + triangleLines) is not None:
+				if blocked(point0, point1):
 					if (point0, point1) not in lines + triangleLines and (point1, point0) not in lines + triangleLines:
 						continue
 
 				for point2 in points:
 					if point2 is not point0 and point2 is not point1: # and point2 not in currTriangle:
-						if rayTraceWorldNoEndPoints(point1, point2, lines + triangleLines) is not None:
+						if blocked(point1, point2):
 							if (point1, point2) not in lines + triangleLines and (point2, point1) not in lines + triangleLines:
 								continue
 
-						if rayTraceWorldNoEndPoints(point2, point0, lines + triangleLines) is not None:
+						if blocked(point2, point0):
 							if (point2, point0) not in lines + triangleLines and (point0, point2) not in lines + triangleLines:
 								continue
 
@@ -86,10 +92,11 @@ def myCreatePathNetwork(world, agent = None):
 
 	remove = []
 	for poly in polys:
-		for obstacle in obstacles:
+		polygon = CompiledPolygon(poly)
+		for obstacle, obstaclePolygon in zip(obstacles, obstaclePolygons):
 			# Remove triangles that encompass obstacles
 			for point in obstacle:
-				if pointInsidePolygonPoints(point, poly) and (not pointOnPolygon(point, poly) and point not in poly):
+				if polygon.contains(point) and (not pointOnPolygon(point, poly) and point not in poly):
 					remove.append(poly)
 					break
 
@@ -101,7 +108,7 @@ def myCreatePathNetwork(world, agent = None):
 				else:
 					point1 = poly[i + 1]
 				midpoint = ((point0[0] + point1[0]) / 2, (point0[1] + point1[1]) / 2)
-				if pointInsidePolygonPoints(midpoint, obstacle) and pointOnPolygon(midpoint, obstacle) is False:
+				if obstaclePolygon.contains(midpoint) and pointOnPolygon(midpoint, obstacle) is False:
 					remove.append(poly)
 					break
 	polys = [poly for poly in polys if poly not in remove]
@@ -166,29 +173,15 @@ def myCreatePathNetwork(world, agent = None):
 	# Create path edges by connecting unobstructed pathnodes within each polygon
 	connectedNodes = []
 	for poly in polys:
-		for node0 in nodes:
-			for node1 in nodes:
+		polygon = CompiledPolygon(poly)
+		# The pathnodes in or on this polygon, in the same order as nodes
+		inside = [node for node in nodes if pointOnPolygon(node, poly) or polygon.contains(node)]
+		for node0 in inside:
+			for node1 in inside:
 				if node1 is not node0 and \
-						(pointOnPolygon(node0, poly) or pointInsidePolygonPoints(node0, poly)) and \
-						(pointOnPolygon(node1, poly) or pointInsidePolygonPoints(node1, poly)) and \
 						(node0, node1) not in edges and (node1, node0) not in edges:
-					# Calculate angle of the line
-					dy = node0[1] - node1[1]
-					dx = node0[0] - node1[0]
-					theta = math.atan2(dy, dx)
-
-					# Calculate perpendicular angles
-					left = theta + math.pi / 2
-					right = theta - math.pi / 2
-
-					# Calculate points to draw parallel rays
-					leftPoint0 = (node0[0] + radius * math.cos(left), node0[1] + radius * math.sin(left))
-					leftPoint2 = (node1[0] + radius * math.cos(left), node1[1] + radius * math.sin(left))
-					rightPoint0 = (node0[0] + radius * math.cos(right), node0[1] + radius * math.sin(right))
-					rightPoint1 = (node1[0] + radius * math.cos(right), node1[1] + radius * math.sin(right))
-
-					# Check for obstacle collisions against three parallel lines and connect pathnodes if no collisions are found
-					if rayTraceWorld(node0, node1, lines) is None and rayTraceWorld(leftPoint0, leftPoint2, lines) is None and rayTraceWorld(rightPoint0, rightPoint1, lines) is None:
+					# Connect pathnodes if the agent can sweep from one to the other without hitting an obstacle
+					if capsuleClear(node0, node1, radius, lines):
 						edges.append((node0, node1))
 						if node0 not in connectedNodes:
 							connectedNodes.append(node0)
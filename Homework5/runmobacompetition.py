@@ -27,14 +27,18 @@ from agents import *
 from moba import *
 
 if len(sys.argv) < 3:
-	print "Usage: python " + sys.argv[0] + " classname1 classname2"
+	print "Usage: python " + sys.argv[0] + " classname1 classname2 [headless] [profile]"
 	print "classname1 and classname2 must be in files with the same located in this directory."
+	print "headless runs the match without a window, as fast as possible."
+	print "profile times every part of every tick and prints the times when the match ends (or when 'p' is pressed)."
 	exit(1)
 
 module1 = __import__(sys.argv[1])
 module2 = __import__(sys.argv[2])
 class1 = getattr(module1, sys.argv[1])
 class2 = getattr(module2, sys.argv[2])
+headless = "headless" in sys.argv[3:]
+profile = "profile" in sys.argv[3:]
 
 ############################
 ### How to use this file
@@ -42,6 +46,8 @@ class2 = getattr(module2, sys.argv[2])
 ### Use this file to conduct a competition with other agents.
 ### Step 1: Give your MyMinion class an unique name, e.g., MarkMinion. Change the file name to match the class name exactly.
 ### Step 2: python runmobacompetition.py classname1 classname2
+### Add "headless" as a third argument to run without a window (e.g., on a machine with no display).
+### Add "profile" to see where the time in each tick goes.
 
 
 
@@ -50,6 +56,9 @@ class2 = getattr(module2, sys.argv[2])
 
 dims = (1200, 1200)
 
+# Headless matches that haven't been decided after this many ticks are called a draw
+MAXTICKS = 36000
+
 obstacles = [[(400, 100), (1100, 100), (1100, 800), (1010, 875), (990, 875), (900, 750), (900, 500), (700, 300), (450, 300), (325, 210), (325, 190)]
 			 ]
 
@@ -80,7 +89,9 @@ class MyAlienMinion(class2):
 
 ########################
 
-world = MOBAWorld(SEED, dims, dims, 2, 60)
+world = MOBAWorld(SEED, dims, dims, 2, 60, headless)
+if profile:
+	world.enableProfiling()
 agent = Hero((SCREEN[0]/2, SCREEN[1]/2), 0, world)
 agent.team = 0
 world.setPlayerAgent(agent)
@@ -157,4 +168,8 @@ ai2.start()
 '''
 world.makePotentialGates()
 
-world.run()
+if headless:
+	world.runUntil(lambda w: w.getWinner() is not None, MAXTICKS)
+	print "Winner", world.getWinner(), "after", world.ticks, "ticks"
+else:
+	world.run()
@@ -24,15 +24,46 @@ from constants import *
 ########################
 ### PYGAME STUFF
 
+# Every image loaded so far, keyed by (name, colorkey).
+# The same surface is handed to everything that loads the image, so it must never be drawn on.
+imageCache = {}
+
 def load_image(name, colorkey=None):
-  image = pygame.image.load(name)
-  image = image.convert()
-  if colorkey is not None:
-    if colorkey is -1:
-      colorkey = image.get_at((0,0))
-    image.set_colorkey(colorkey, RLEACCEL)
+  key = (name, colorkey)
+  image = imageCache.get(key)
+  if image is None:
+    image = pygame.image.load(name)
+    # Without a display (headless worlds) the image cannot be converted to the screen format
+    if pygame.display.get_surface() is not None:
+      image = image.convert()
+    if colorkey is not None:
+      if colorkey is -1:
+        colorkey = image.get_at((0,0))
+      image.set_colorkey(colorkey, RLEACCEL)
+    imageCache[key] = image
   return image, image.get_rect()
 
+# Rotated copies of images, keyed by (image, bucket). Built lazily and shared the same way as imageCache.
+# Each entry is (rotated image, size of rotated image).
+rotationCache = {}
+
+# Rotate an image counterclockwise by angle degrees.
+# The angle is snapped to one of buckets evenly spaced angles so that rotated images can be reused.
+# If buckets is 0 (or None) the image is rotated by exactly angle degrees every time.
+# Returns the rotated image and a new rect of the rotated image's size.
+def rotate_image(image, angle, buckets = ROTATIONBUCKETS):
+  if not buckets:
+    rotated = pygame.transform.rotate(image, angle)
+    return rotated, rotated.get_rect()
+  bucket = int(round(angle * buckets / 360.0)) % buckets
+  key = (image, bucket)
+  entry = rotationCache.get(key)
+  if entry is None:
+    rotated = pygame.transform.rotate(image, bucket * 360.0 / buckets)
+    entry = (rotated, rotated.get_size())
+    rotationCache[key] = entry
+  return entry[0], pygame.Rect((0, 0), entry[1])
+
 
 ############################
 ### OTHER STUFF
@@ -111,19 +142,50 @@ def getIntersectPoint(p1, p2, p3, p4):
   
   
  
+# Which side of the line through a and b the point c is on: positive for one side, negative for the other, and zero if c is on the line.
+# (Twice the signed area of the triangle a, b, c.) No division, so there is nothing to go wrong for vertical or parallel lines.
+def orientation(a, b, c):
+	return (b[0] - a[0])*(c[1] - a[1]) - (b[1] - a[1])*(c[0] - a[0])
+
+# Is the point p inside the bounding box of the segment p1 to p2 (edges included)?
+def inSegmentBox(p, p1, p2):
+	return min(p1[0], p2[0]) <= p[0] <= max(p1[0], p2[0]) and min(p1[1], p2[1]) <= p[1] <= max(p1[1], p2[1])
+
 # For line segments (ie not infinitely long lines) the intersect point
 # may not lay on both lines.
-#   
-# If the point where two lines intersect is inside both line's bounding
-# rectangles then the lines intersect. Returns intersect point if the line
-# intesect o None if not
+#
+# Returns the point where the segments p1 to p2 and p3 to p4 intersect, or None if they don't.
+# Segments whose bounding boxes don't overlap are rejected first. Otherwise the segments intersect if neither one is strictly on one side of the other.
+# Segments that touch at an endpoint intersect there, and that endpoint is returned as it is.
+# Overlapping collinear segments intersect at the first of p1, p2, p3, p4 that is on both.
 def calculateIntersectPoint(p1, p2, p3, p4):
-	p = getIntersectPoint(p1, p2, p3, p4)
-	if p is not None:
-		p = p[0]
-		if between(p[0], p1[0], p2[0]) and between(p[1], p1[1], p2[1]) and between(p[0], p3[0], p4[0]) and between(p[1], p3[1], p4[1]):
-			return p
-	return None
+	if max(p1[0], p2[0]) < min(p3[0], p4[0]) or min(p1[0], p2[0]) > max(p3[0], p4[0]) or max(p1[1], p2[1]) < min(p3[1], p4[1]) or min(p1[1], p2[1]) > max(p3[1], p4[1]):
+		return None
+	d1 = orientation(p3, p4, p1)
+	d2 = orientation(p3, p4, p2)
+	if (d1 > 0 and d2 > 0) or (d1 < 0 and d2 < 0):
+		return None
+	d3 = orientation(p1, p2, p3)
+	d4 = orientation(p1, p2, p4)
+	if (d3 > 0 and d4 > 0) or (d3 < 0 and d4 < 0):
+		return None
+	if d1 == 0 and d2 == 0:
+		# Collinear
+		for p in (p1, p2, p3, p4):
+			if inSegmentBox(p, p1, p2) and inSegmentBox(p, p3, p4):
+				return p
+		return None
+	if d1 == 0:
+		return p1
+	if d2 == 0:
+		return p2
+	if d3 == 0:
+		return p3
+	if d4 == 0:
+		return p4
+	# A proper crossing. d1 and d2 are how far p1 and p2 are from the other line, so they say how far along p1 to p2 the crossing is.
+	t = d1 / float(d1 - d2)
+	return (p1[0] + t*(p2[0] - p1[0]), p1[1] + t*(p2[1] - p1[1]))
 
 # Checks if the first number is between the other two numbers.
 # Also returns true if all numbers are very close together to the point where they are essentially equal
@@ -139,7 +201,11 @@ def rayTrace(p1, p2, line):
 	return calculateIntersectPoint(line[0], line[1], p1, p2)
 	#pygame.draw.line(background, (0, 0, 0), p1, p2)
 	
+# worldLines can also be an (N, 4) array from packLines(), which is traced all at once (see rayTraceLines).
+# Packing takes about as long as tracing a list, so pack once and trace many rays against the array.
 def rayTraceWorld(p1, p2, worldLines):
+	if isinstance(worldLines, numpy.ndarray):
+		return rayTraceLines(p1, p2, worldLines)
 	for l in worldLines:
 		hit = rayTrace(p1, p2, l)
 		if hit != None:
@@ -176,13 +242,223 @@ def rayTraceNoEndpoints(p1, p2, line):
 	return None
 
 # Check whether the line between p1 and p2 intersects any line anywhere except an endpoint of any of the lines.
+# worldLines can also be an (N, 4) array from packLines().
 def rayTraceWorldNoEndPoints(p1, p2, worldLines):
+	if isinstance(worldLines, numpy.ndarray):
+		return rayTraceLinesNoEndPoints(p1, p2, worldLines)
 	for l in worldLines:
 		hit = rayTraceNoEndpoints(p1, p2, l)
 		if hit != None:
 			return hit
 	return None
 
+# An immutable copy of a sequence (e.g., the world's lines) that can be handed out over and over instead of making a fresh list for every caller.
+# Callers that want to change what they are given make their own list from it.
+# A snapshot of lines is only packed once (see packLines).
+class Snapshot(tuple):
+
+	array = None
+
+# Pack lines ((x1, y1), (x2, y2)) into an (N, 4) float array (x1, y1, x2, y2) for the array ray tracers below. Arrays are returned as they are.
+# Snapshots never change, so the array for a snapshot is kept with it and handed back the next time.
+def packLines(lines):
+	if isinstance(lines, numpy.ndarray):
+		return lines
+	if isinstance(lines, Snapshot):
+		if lines.array is None:
+			lines.array = numpy.array(lines, dtype = float).reshape(-1, 4)
+		return lines.array
+	return numpy.array(lines, dtype = float).reshape(-1, 4)
+
+# Intersect the segment p1 to p2 with every segment in lines, an (N, 4) array.
+# Does the same arithmetic as calculateIntersectPoint(line[0], line[1], p1, p2) for each line, so the answers are identical, just all at once.
+# Returns (hits, xs, ys): hits is an (N,) boolean array, and (xs[i], ys[i]) is where line i is hit if hits[i].
+def intersectLines(p1, p2, lines):
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	# Which side of p1 to p2 each end of each line is on, and which side of each line p1 and p2 are on (see orientation)
+	d1 = (p2[0] - p1[0])*(y1 - p1[1]) - (p2[1] - p1[1])*(x1 - p1[0])
+	d2 = (p2[0] - p1[0])*(y2 - p1[1]) - (p2[1] - p1[1])*(x2 - p1[0])
+	d3 = (x2 - x1)*(p1[1] - y1) - (y2 - y1)*(p1[0] - x1)
+	d4 = (x2 - x1)*(p2[1] - y1) - (y2 - y1)*(p2[0] - x1)
+	hits = boxesOverlap(p1, p2, lines) & ~(((d1 > 0) & (d2 > 0)) | ((d1 < 0) & (d2 < 0)) | ((d3 > 0) & (d4 > 0)) | ((d3 < 0) & (d4 < 0)))
+	# Proper crossings
+	t = d1 / numpy.where(d1 == d2, 1.0, d1 - d2)
+	xs = x1 + t*(x2 - x1)
+	ys = y1 + t*(y2 - y1)
+	# Touching at an endpoint, in reverse order of preference so that the preferred endpoint is written last
+	for d, x, y in ((d4, p2[0], p2[1]), (d3, p1[0], p1[1]), (d2, x2, y2), (d1, x1, y1)):
+		xs = numpy.where(d == 0, x, xs)
+		ys = numpy.where(d == 0, y, ys)
+	# Collinear: the first endpoint that is on both
+	collinear = (d1 == 0) & (d2 == 0)
+	if collinear.any():
+		found = numpy.zeros(len(lines), dtype = bool)
+		for x, y in ((x1, y1), (x2, y2), (p1[0], p1[1]), (p2[0], p2[1])):
+			inside = collinear & ~found & (x >= numpy.minimum(x1, x2)) & (x <= numpy.maximum(x1, x2)) & (y >= numpy.minimum(y1, y2)) & (y <= numpy.maximum(y1, y2)) & (x >= min(p1[0], p2[0])) & (x <= max(p1[0], p2[0])) & (y >= min(p1[1], p2[1])) & (y <= max(p1[1], p2[1]))
+			xs = numpy.where(inside, x, xs)
+			ys = numpy.where(inside, y, ys)
+			found |= inside
+		hits &= ~collinear | found
+	return hits, xs, ys
+
+# Any-hit ray trace against an (N, 4) array of lines. Returns the point where the first line (in array order) that p1 to p2 crosses is hit, or None.
+# Same answer as rayTraceWorld on the unpacked lines.
+def rayTraceLines(p1, p2, lines):
+	candidates = numpy.flatnonzero(boxesOverlap(p1, p2, lines))
+	if len(candidates) == 0:
+		return None
+	hits, xs, ys = intersectLines(p1, p2, lines[candidates])
+	i = numpy.argmax(hits)
+	if hits[i]:
+		return (float(xs[i]), float(ys[i]))
+	return None
+
+# Nearest-hit ray trace against an (N, 4) array of lines. Returns the hit point closest to p1, and the index of the line it is on, or None.
+# If several lines are hit equally close to p1, the first of them (in array order) is the one returned.
+def rayTraceLinesNearest(p1, p2, lines):
+	candidates = numpy.flatnonzero(boxesOverlap(p1, p2, lines))
+	if len(candidates) == 0:
+		return None
+	hits, xs, ys = intersectLines(p1, p2, lines[candidates])
+	if not hits.any():
+		return None
+	d = numpy.where(hits, (xs - p1[0])**2 + (ys - p1[1])**2, INFINITY)
+	i = numpy.argmin(d)
+	return (float(xs[i]), float(ys[i])), int(candidates[i])
+
+# Which lines in an (N, 4) array have bounding boxes that overlap the bounding box of p1 to p2.
+# Lines that don't can't be hit, so this is a cheap way to skip most of them.
+def boxesOverlap(p1, p2, lines):
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	lox = min(p1[0], p2[0])
+	hix = max(p1[0], p2[0])
+	loy = min(p1[1], p2[1])
+	hiy = max(p1[1], p2[1])
+	return ((x1 >= lox) | (x2 >= lox)) & ((x1 <= hix) | (x2 <= hix)) & ((y1 >= loy) | (y2 >= loy)) & ((y1 <= hiy) | (y2 <= hiy))
+
+# Which of the segments in rays, an (R, 4) array, hit which of the segments in lines, an (N, 4) array?
+# Same hit or miss as calculateIntersectPoint for every pair, all at once. Returns an (R, N) boolean array.
+def segmentsIntersect(rays, lines):
+	px1, py1, px2, py2 = rays[:, 0:1], rays[:, 1:2], rays[:, 2:3], rays[:, 3:4]
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	box = (numpy.maximum(x1, x2) >= numpy.minimum(px1, px2)) & (numpy.minimum(x1, x2) <= numpy.maximum(px1, px2)) & (numpy.maximum(y1, y2) >= numpy.minimum(py1, py2)) & (numpy.minimum(y1, y2) <= numpy.maximum(py1, py2))
+	d1 = (px2 - px1)*(y1 - py1) - (py2 - py1)*(x1 - px1)
+	d2 = (px2 - px1)*(y2 - py1) - (py2 - py1)*(x2 - px1)
+	d3 = (x2 - x1)*(py1 - y1) - (y2 - y1)*(px1 - x1)
+	d4 = (x2 - x1)*(py2 - y1) - (y2 - y1)*(px2 - x1)
+	# Collinear segments whose boxes overlap always share a point, so they need no more than this
+	return box & ~(((d1 > 0) & (d2 > 0)) | ((d1 < 0) & (d2 < 0)) | ((d3 > 0) & (d4 > 0)) | ((d3 < 0) & (d4 < 0)))
+
+# Which points can see which other points? points is a list of points, and lines is an (N, 4) array.
+# Returns a (P, P) boolean array where [i, j] is True if rayTraceWorldNoEndPoints(points[i], points[j], lines) is None.
+def visibilityMatrix(points, lines):
+	points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	visible = numpy.zeros((len(points), len(points)), dtype = bool)
+	for i in xrange(len(points)):
+		# Rays from points[i] to every point
+		rays = numpy.hstack((numpy.repeat(points[i:i+1], len(points), axis = 0), points))
+		rx1, ry1, rx2, ry2 = rays[:, 0:1], rays[:, 1:2], rays[:, 2:3], rays[:, 3:4]
+		starts = (x1 == rx1) & (y1 == ry1)
+		ends = (x2 == rx2) & (y2 == ry2)
+		startsReversed = (x1 == rx2) & (y1 == ry2)
+		endsReversed = (x2 == rx1) & (y2 == ry1)
+		# The same line: bad. Sharing an endpoint: good. (See rayTraceNoEndpoints.)
+		same = (starts & ends) | (startsReversed & endsReversed)
+		shared = starts | ends | startsReversed | endsReversed
+		visible[i] = ~(same | (segmentsIntersect(rays, lines) & ~shared)).any(axis = 1)
+	return visible
+
+# Array version of rayTraceWorldNoEndPoints. Same answer as rayTraceNoEndpoints on each line, in order.
+def rayTraceLinesNoEndPoints(p1, p2, lines):
+	lines = lines[boxesOverlap(p1, p2, lines)]
+	if len(lines) == 0:
+		return None
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	starts = (x1 == p1[0]) & (y1 == p1[1])
+	ends = (x2 == p2[0]) & (y2 == p2[1])
+	startsReversed = (x1 == p2[0]) & (y1 == p2[1])
+	endsReversed = (x2 == p1[0]) & (y2 == p1[1])
+	# The same line: bad. Sharing an endpoint: good.
+	same = (starts & ends) | (startsReversed & endsReversed)
+	shared = starts | ends | startsReversed | endsReversed
+	hits, xs, ys = intersectLines(p1, p2, lines)
+	hits = same | (hits & ~shared)
+	i = numpy.argmax(hits)
+	if not hits[i]:
+		return None
+	if same[i]:
+		return p1
+	return (float(xs[i]), float(ys[i]))
+
+
+# Check whether a line segment passes through (or touches) the axis-aligned box from minpt to maxpt.
+# Liang-Barsky clipping: the segment is parameterized as line[0] + t (line[1] - line[0]), and clipped against each side of the box in turn.
+def lineInBox(line, minpt, maxpt):
+	(x1, y1), (x2, y2) = line
+	dx = x2 - x1
+	dy = y2 - y1
+	t0 = 0.0
+	t1 = 1.0
+	for p, q in ((-dx, x1 - minpt[0]), (dx, maxpt[0] - x1), (-dy, y1 - minpt[1]), (dy, maxpt[1] - y1)):
+		if p == 0:
+			# Parallel to this side: either entirely inside or entirely outside of it
+			if q < 0:
+				return False
+		else:
+			t = q / float(p)
+			if p < 0:
+				if t > t1:
+					return False
+				t0 = max(t0, t)
+			else:
+				if t < t0:
+					return False
+				t1 = min(t1, t)
+	return True
+
+# Sweep many moving points against many line segments at once.
+# starts: (N, 2) array of where each point starts
+# steps: (N, 2) array of how far each point moves
+# lines: (L, 4) array of segments (x1, y1, x2, y2)
+# Returns an (N, L) array holding the fraction of its step (0 to 1) at which each point crosses each segment, or INFINITY if it doesn't.
+# Points moving parallel to a segment never cross it.
+def sweepPointsAgainstLines(starts, steps, lines):
+	if len(starts) == 0 or len(lines) == 0:
+		return numpy.full((len(starts), len(lines)), INFINITY)
+	origins = lines[:, 0:2]
+	edges = lines[:, 2:4] - origins
+	# Solve start + t*step = origin + u*edge using 2D cross products
+	denom = steps[:, 0:1]*edges[:, 1] - steps[:, 1:2]*edges[:, 0]
+	dx = origins[:, 0] - starts[:, 0:1]
+	dy = origins[:, 1] - starts[:, 1:2]
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		t = (dx*edges[:, 1] - dy*edges[:, 0]) / denom
+		u = (dx*steps[:, 1:2] - dy*steps[:, 0:1]) / denom
+	hit = (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+	return numpy.where(hit, t, INFINITY)
+
+# Sweep many moving points against many circles at once.
+# starts: (N, 2) array of where each point starts
+# steps: (N, 2) array of how far each point moves
+# centers: (C, 2) array of circle centers
+# radii: (C,) array of circle radii
+# Returns an (N, C) array holding the fraction of its step (0 to 1) at which each point enters each circle (0 if it starts inside), or INFINITY if it doesn't.
+def sweepPointsAgainstCircles(starts, steps, centers, radii):
+	if len(starts) == 0 or len(centers) == 0:
+		return numpy.full((len(starts), len(centers)), INFINITY)
+	# Solve |start + t*step - center| = radius for the smallest t
+	fx = starts[:, 0:1] - centers[:, 0]
+	fy = starts[:, 1:2] - centers[:, 1]
+	a = steps[:, 0:1]**2 + steps[:, 1:2]**2
+	b = 2.0 * (fx*steps[:, 0:1] + fy*steps[:, 1:2])
+	c = fx**2 + fy**2 - radii**2
+	disc = b**2 - 4.0*a*c
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		t = (-b - numpy.sqrt(numpy.maximum(disc, 0.0))) / (2.0*a)
+	inside = c <= 0
+	hit = inside | ((a > 0) & (disc >= 0) & (t >= 0) & (t <= 1))
+	return numpy.where(inside, 0.0, numpy.where(hit, t, INFINITY))
 
 # Return minimum distance between line segment and point
 def minimumDistance(line, point):
@@ -202,6 +478,78 @@ def minimumDistance(line, point):
 	p3 = (line[0][0] + (t * (line[1][0] - line[0][0])), line[0][1] + (t * (line[1][1] - line[0][1]))) # projection falls on the segment
 	return distance(point, p3)
 
+# Distance from every point to every segment, all at once. Same as minimumDistance(line, point) for each pair.
+# points: list of points or (P, 2) array
+# lines: (N, 4) array of segments (see packLines)
+# Returns a (P, N) array.
+def pointsToLinesDistance(points, lines):
+	points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	px = points[:, 0:1]
+	py = points[:, 1:2]
+	x1 = lines[:, 0]
+	y1 = lines[:, 1]
+	dx = lines[:, 2] - x1
+	dy = lines[:, 3] - y1
+	d2 = dx*dx + dy*dy
+	# Where the projection of the point falls along each segment, clamped to the segment. Zero-length segments are just their first point.
+	t = numpy.clip(((px - x1)*dx + (py - y1)*dy) / numpy.where(d2 == 0.0, 1.0, d2), 0.0, 1.0)
+	return numpy.hypot(px - (x1 + t*dx), py - (y1 + t*dy))
+
+# Distance from one point to every segment in lines, an (N, 4) array. Returns an (N,) array.
+def pointToLinesDistance(point, lines):
+	return pointsToLinesDistance([point], lines)[0]
+
+# Is any segment in lines, an (N, 4) array, closer than threshold to the point?
+# Segments whose bounding boxes are farther than threshold away are skipped without working out the distance.
+def anyLineWithin(point, lines, threshold):
+	x, y = point
+	near = (numpy.minimum(lines[:, 0], lines[:, 2]) < x + threshold) & (numpy.maximum(lines[:, 0], lines[:, 2]) > x - threshold) & (numpy.minimum(lines[:, 1], lines[:, 3]) < y + threshold) & (numpy.maximum(lines[:, 1], lines[:, 3]) > y - threshold)
+	if not near.any():
+		return False
+	return bool((pointToLinesDistance(point, lines[near]) < threshold).any())
+
+# Which points have a segment in lines closer than threshold? threshold is a number, or one number per point.
+# Returns a (P,) boolean array.
+def pointsNearLines(points, lines, threshold):
+	if len(lines) == 0:
+		return numpy.zeros(len(points), dtype = bool)
+	return (pointsToLinesDistance(points, lines) < numpy.reshape(threshold, (-1, 1))).any(axis = 1)
+
+# Which segments in lines, an (N, 4) array, cross the segment p1 to p2? Returns an (N,) boolean array.
+# Each end of a crossing segment is strictly on a different side of p1 to p2, and p1 and p2 are strictly on different sides of it, so touching doesn't count.
+def segmentsCross(p1, p2, lines):
+	x1, y1, x2, y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+	dx = p2[0] - p1[0]
+	dy = p2[1] - p1[1]
+	ldx = x2 - x1
+	ldy = y2 - y1
+	sides = (dx*(y1 - p1[1]) - dy*(x1 - p1[0])) * (dx*(y2 - p1[1]) - dy*(x2 - p1[0]))
+	lineSides = (ldx*(p1[1] - y1) - ldy*(p1[0] - x1)) * (ldx*(p2[1] - y1) - ldy*(p2[0] - x1))
+	return (sides < 0) & (lineSides < 0)
+
+# Can a circle of the given radius sweep from p1 to p2 without running into any segment in lines? lines is a list of lines or an (N, 4) array.
+# The circle sweeps out a capsule: everything within radius of the segment p1 to p2. A segment is in the way if it reaches into the capsule.
+# escaping: if True, a segment the circle already overlaps at p1 is only in the way if the sweep goes further into it, so an agent brushing a wall can still move along it or away from it.
+# Otherwise any segment within radius of the sweep is in the way, including one the circle starts on.
+# Segments whose bounding boxes are farther than radius from the bounding box of p1 to p2 are skipped without working out the distance.
+def capsuleClear(p1, p2, radius, lines, escaping = False):
+	lines = packLines(lines)
+	near = (numpy.minimum(lines[:, 0], lines[:, 2]) < max(p1[0], p2[0]) + radius) & (numpy.maximum(lines[:, 0], lines[:, 2]) > min(p1[0], p2[0]) - radius) & (numpy.minimum(lines[:, 1], lines[:, 3]) < max(p1[1], p2[1]) + radius) & (numpy.maximum(lines[:, 1], lines[:, 3]) > min(p1[1], p2[1]) - radius)
+	if not near.any():
+		return True
+	lines = lines[near]
+	# Anything that crosses p1 to p2 is in the way. This rules out most blocked sweeps without working out any distances.
+	if segmentsCross(p1, p2, lines).any():
+		return False
+	# Segments that don't cross are closest at an endpoint of one or the other
+	fromEnds = pointsToLinesDistance([p1, p2], lines)
+	toEnds = pointsToLinesDistance(lines.reshape(-1, 2), numpy.array([[p1[0], p1[1], p2[0], p2[1]]], dtype = float)).reshape(-1, 2)
+	d = numpy.minimum(fromEnds.min(axis = 0), toEnds.min(axis = 1))
+	if not escaping:
+		return not (d < radius).any()
+	start = fromEnds[0]
+	return not ((d < radius) & ((start >= radius) | (d < start - EPSILON))).any()
+
 
 #Polygon is a set of points
 def pointOnPolygon(point, polygon):
@@ -227,6 +575,8 @@ def withinRangeOfPoints(point, range, list):
 	return False
 
 def drawPolygon(poly, screen, color = (0, 0, 0), width = 1, center = False):
+	if screen is None:
+		return
 	last = None
 	for p in poly:
 		if last != None:
@@ -321,15 +671,66 @@ def pointInsidePolygonLines(point, polygon):
 	return count%2 == 1
 
 #Determine whether a point is inside an simple polygon. Polygon is a set of points.
+#Points on the boundary are inside. When testing many points against the same polygon, make a CompiledPolygon once instead.
 def pointInsidePolygonPoints(point, polygon):
-	lines = []
-	last = None
-	for p in polygon:
-		if last != None:
-			lines.append((last, p))
-		last = p
-	lines.append((polygon[len(polygon)-1], polygon[0]))
-	return pointInsidePolygonLines(point, lines)
+	return CompiledPolygon(polygon).contains(point)
+
+# A simple polygon that has been prepared for testing lots of points: its edges and bounding box are worked out once.
+# Points outside the bounding box are rejected right away. The rest are tested by counting the edges crossed by a horizontal ray from the point (crossing number).
+# Points on the boundary (give or take EPSILON) are inside.
+class CompiledPolygon():
+
+	### points: the points of the polygon, in order
+	### edges: the edges of the polygon ((x1, y1), (x2, y2)), including the one that closes it
+	### edgeArray: the edges packed into an (E, 4) array (see packLines)
+	### box: the bounding box (minx, miny, maxx, maxy)
+
+	def __init__(self, points):
+		self.points = list(points)
+		self.edges = [(self.points[i-1], self.points[i]) for i in xrange(len(self.points))]
+		self.edgeArray = packLines(self.edges)
+		xs = [p[0] for p in self.points]
+		ys = [p[1] for p in self.points]
+		self.box = (min(xs), min(ys), max(xs), max(ys))
+
+	def inBox(self, point):
+		minx, miny, maxx, maxy = self.box
+		return point[0] >= minx - EPSILON and point[0] <= maxx + EPSILON and point[1] >= miny - EPSILON and point[1] <= maxy + EPSILON
+
+	### Is the point inside the polygon?
+	def contains(self, point):
+		if not self.inBox(point):
+			return False
+		x, y = point
+		inside = False
+		for (x1, y1), (x2, y2) in self.edges:
+			dx = x2 - x1
+			dy = y2 - y1
+			# On the edge: on the line through the edge, and between its ends
+			if abs(dx*(y - y1) - dy*(x - x1)) <= EPSILON * (abs(dx) + abs(dy)) and min(x1, x2) - EPSILON <= x <= max(x1, x2) + EPSILON and min(y1, y2) - EPSILON <= y <= max(y1, y2) + EPSILON:
+				return True
+			if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * dx / float(dy):
+				inside = not inside
+		return inside
+
+	### Which of the points are inside the polygon? points is a list of points or an (N, 2) array. Returns an (N,) boolean array.
+	def containsPoints(self, points):
+		points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+		minx, miny, maxx, maxy = self.box
+		result = (points[:, 0] >= minx - EPSILON) & (points[:, 0] <= maxx + EPSILON) & (points[:, 1] >= miny - EPSILON) & (points[:, 1] <= maxy + EPSILON)
+		candidates = numpy.flatnonzero(result)
+		if len(candidates) == 0:
+			return result
+		x = points[candidates, 0:1]
+		y = points[candidates, 1:2]
+		x1, y1, x2, y2 = self.edgeArray[:, 0], self.edgeArray[:, 1], self.edgeArray[:, 2], self.edgeArray[:, 3]
+		dx = x2 - x1
+		dy = y2 - y1
+		onEdge = (numpy.abs(dx*(y - y1) - dy*(x - x1)) <= EPSILON * (numpy.abs(dx) + numpy.abs(dy))) & (x >= numpy.minimum(x1, x2) - EPSILON) & (x <= numpy.maximum(x1, x2) + EPSILON) & (y >= numpy.minimum(y1, y2) - EPSILON) & (y <= numpy.maximum(y1, y2) + EPSILON)
+		straddles = (y1 > y) != (y2 > y)
+		crosses = straddles & (x < x1 + (y - y1) * dx / numpy.where(straddles, dy, 1.0))
+		result[candidates] = onEdge.any(axis = 1) | (crosses.sum(axis = 1) % 2 == 1)
+		return result
 
 # Angle between two lines originating at (0, 0). Lenght of lines must be greater than 0.
 def angle(pt1, pt2):
@@ -348,6 +749,7 @@ def vectorMagnitude(v):
 def findClosestUnobstructed(p, nodes, worldLines):
 	best = None
 	dist = INFINITY
+	worldLines = packLines(worldLines)
 	for n in nodes:
 		if rayTraceWorld(p, n, worldLines) == None:
 			d = distance(p, n)
@@ -376,5 +778,7 @@ def findClosestUnobstructed(p, nodes, worldLines):
 
 	
 def drawCross(surface, point, color = (0, 0, 0), size = 2, width = 1):
+	if surface is None:
+		return
 	pygame.draw.line(surface, color, (point[0]-size, point[1]-size), (point[0]+size, point[1]+size), width)
 	pygame.draw.line(surface, color, (point[0]+size, point[1]-size), (point[0]-size, point[1]+size), width)
@@ -27,6 +27,12 @@ OBSTACLESIGMA = 50
 OBSTACLEMIN = 25
 OBSTACLEPOINTS = 7
 OBSTACLEGRIDSIZE = 50
+COLLISIONGRIDSIZE = 50
+ROTATIONBUCKETS = 360
+PROFILEWINDOW = 600
+LOSRESOLUTION = 8
+LOSCACHESIZE = 4096
+PATHCACHESIZE = 1024
 NUMRESOURCES = 20
 SEED = 2
 HITPOINTS = 25
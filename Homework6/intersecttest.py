@@ -0,0 +1,221 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+# Randomized check of the segment intersection code in utils.py.
+# Compares calculateIntersectPoint against the slope-and-intercept version it replaced and against exact rational arithmetic,
+# checks that intersectLines gives the same answers over arrays, and that the any-hit and nearest-hit ray traces over arrays of lines
+# (rayTraceLines, rayTraceLinesNearest) agree with tracing the lines one at a time.
+# Usage: python intersecttest.py [pairs] [seed]
+
+import sys, random, numpy
+from fractions import Fraction
+
+from constants import *
+from utils import *
+
+
+# The slope-and-intercept implementation that calculateIntersectPoint replaced, kept here to compare against
+
+def oldGradient(p1, p2):
+	if (p1[0] != p2[0]):
+		return (p1[1] - p2[1]) / float(p1[0] - p2[0])
+	else:
+		return None
+
+def oldYAxisIntersect(p, m):
+	return p[1] - (m * p[0])
+
+def oldGetIntersectPoint(p1, p2, p3, p4):
+	m1 = oldGradient(p1, p2)
+	m2 = oldGradient(p3, p4)
+	if (m1 != m2):
+		if (m1 is not None and m2 is not None):
+			b1 = oldYAxisIntersect(p1, m1)
+			b2 = oldYAxisIntersect(p3, m2)
+			x = (b2 - b1) / float(m1 - m2)
+			y = (m1 * x) + b1
+		elif (m1 is None):
+			b2 = oldYAxisIntersect(p3, m2)
+			x = p1[0]
+			y = (m2 * x) + b2
+		else:
+			b1 = oldYAxisIntersect(p1, m1)
+			x = p3[0]
+			y = (m1 * x) + b1
+		return ((x,y),)
+	else:
+		b1, b2 = None, None
+		if m1 is not None:
+			b1 = oldYAxisIntersect(p1, m1)
+		if m2 is not None:
+			b2 = oldYAxisIntersect(p3, m2)
+		if b1 == b2:
+			return p1,p2,p3,p4
+		else:
+			return None
+
+def oldBetween(p, p1, p2):
+	if (abs(p1 - p2) <= EPSILON):
+		return abs(p - p2) <= EPSILON
+	else:
+		return p >= min(p1, p2) and p <= max(p1, p2)
+
+def oldCalculateIntersectPoint(p1, p2, p3, p4):
+	p = oldGetIntersectPoint(p1, p2, p3, p4)
+	if p is not None:
+		p = p[0]
+		if oldBetween(p[0], p1[0], p2[0]) and oldBetween(p[1], p1[1], p2[1]) and oldBetween(p[0], p3[0], p4[0]) and oldBetween(p[1], p3[1], p4[1]):
+			return p
+	return None
+
+
+# Exact answer: do the segments share a point? Every float is a rational, so this has no rounding at all.
+def exactIntersects(p1, p2, p3, p4):
+	p1, p2, p3, p4 = [(Fraction(p[0]), Fraction(p[1])) for p in (p1, p2, p3, p4)]
+	d1 = orientation(p3, p4, p1)
+	d2 = orientation(p3, p4, p2)
+	d3 = orientation(p1, p2, p3)
+	d4 = orientation(p1, p2, p4)
+	if (d1 > 0 and d2 > 0) or (d1 < 0 and d2 < 0) or (d3 > 0 and d4 > 0) or (d3 < 0 and d4 < 0):
+		return False
+	if d1 == 0 and d2 == 0:
+		return any(inSegmentBox(p, p1, p2) and inSegmentBox(p, p3, p4) for p in (p1, p2, p3, p4))
+	return True
+
+# Is the point within tolerance of both segments?
+def onBoth(p, p1, p2, p3, p4, tolerance = 1e-6):
+	return minimumDistance((p1, p2), p) <= tolerance and minimumDistance((p3, p4), p) <= tolerance
+
+
+# Random segment pairs. Small integers and axis-aligned segments with shared vertices are where parallel, collinear and touching cases come up.
+
+def randomFloatPoint(r):
+	return (r.uniform(0, 1000), r.uniform(0, 1000))
+
+def randomIntegerPoint(r):
+	return (r.randint(0, 6), r.randint(0, 6))
+
+def randomFloatPair(r):
+	return randomFloatPoint(r), randomFloatPoint(r), randomFloatPoint(r), randomFloatPoint(r)
+
+def randomIntegerPair(r):
+	return randomIntegerPoint(r), randomIntegerPoint(r), randomIntegerPoint(r), randomIntegerPoint(r)
+
+def randomAxisAlignedPair(r):
+	points = [(float(r.randint(0, 4) * 50), float(r.randint(0, 4) * 50)) for i in xrange(3)]
+	segments = []
+	for i in xrange(2):
+		p = r.choice(points)
+		if r.random() < 0.5:
+			q = (p[0], float(r.randint(0, 4) * 50))
+		else:
+			q = (float(r.randint(0, 4) * 50), p[1])
+		segments.append((p, q) if r.random() < 0.5 else (q, p))
+	return segments[0][0], segments[0][1], segments[1][0], segments[1][1]
+
+GENERATORS = [("float", randomFloatPair), ("integer", randomIntegerPair), ("axis-aligned", randomAxisAlignedPair)]
+
+
+def check(pairs, seed):
+	r = random.Random(seed)
+	failures = 0
+	for name, generate in GENERATORS:
+		tested = 0
+		oldWrong = 0
+		samePoint = 0
+		differentPoint = 0
+		for i in xrange(pairs):
+			p1, p2, p3, p4 = generate(r)
+			new = calculateIntersectPoint(p1, p2, p3, p4)
+			old = oldCalculateIntersectPoint(p1, p2, p3, p4)
+			exact = exactIntersects(p1, p2, p3, p4)
+			tested += 1
+			# The new version must agree with exact arithmetic, and any point it returns must be on both segments
+			if (new is not None) != exact or (new is not None and not onBoth(new, p1, p2, p3, p4)):
+				print "FAIL", name, (p1, p2, p3, p4), "new", new, "exact", exact
+				failures += 1
+			# Where the old version disagrees, it has to be the one that is wrong
+			if (old is not None) != (new is not None):
+				oldWrong += 1
+			elif old is not None:
+				if new == old or distance(new, old) <= 1e-6:
+					samePoint += 1
+				else:
+					differentPoint += 1
+			# The array version must give exactly the same answer as the scalar one (rayTrace passes the line first)
+			hits, xs, ys = intersectLines(p3, p4, numpy.array([[p1[0], p1[1], p2[0], p2[1]]], dtype = float))
+			if bool(hits[0]) != (new is not None) or (new is not None and (float(xs[0]), float(ys[0])) != (float(new[0]), float(new[1]))):
+				print "FAIL", name, "intersectLines", (p1, p2, p3, p4), (bool(hits[0]), float(xs[0]), float(ys[0])), "calculateIntersectPoint", new
+				failures += 1
+			# rayTraceNoEndpoints ignores segments that share an endpoint, and otherwise is calculateIntersectPoint
+			if (p1, p2) != (p3, p4) and (p2, p1) != (p3, p4) and p3 not in (p1, p2) and p4 not in (p1, p2):
+				if rayTraceNoEndpoints(p3, p4, (p1, p2)) != new:
+					print "FAIL", name, "rayTraceNoEndpoints", (p1, p2, p3, p4)
+					failures += 1
+		print name, "pairs", tested, "old version wrong", oldWrong, "same point as old version", samePoint, "different point", differentPoint
+	return failures
+
+# The hit point on the line closest to p1, and the index of that line, found one line at a time; the first line wins a tie, as in rayTraceLinesNearest
+def nearestHit(p1, p2, lines):
+	best = None
+	for i in xrange(len(lines)):
+		hit = rayTrace(p1, p2, lines[i])
+		if hit is not None:
+			d = (hit[0] - p1[0])**2 + (hit[1] - p1[1])**2
+			if best is None or d < best[0]:
+				best = (d, (float(hit[0]), float(hit[1])), i)
+	if best is None:
+		return None
+	return best[1], best[2]
+
+def checkRayTraces(rays, seed):
+	r = random.Random(seed)
+	failures = 0
+	hits = 0
+	for i in xrange(rays):
+		# Axis-aligned lines on a coarse grid share endpoints and overlap, so some rays hit several lines at the same distance
+		if r.random() < 0.5:
+			lines = [(randomFloatPoint(r), randomFloatPoint(r)) for j in xrange(r.randint(1, 30))]
+			p1, p2 = randomFloatPoint(r), randomFloatPoint(r)
+		else:
+			lines = []
+			for j in xrange(r.randint(1, 30)):
+				line = randomAxisAlignedPair(r)
+				lines.append((line[0], line[1]))
+			p1, p2 = randomAxisAlignedPair(r)[:2]
+		array = packLines(lines)
+		expected = nearestHit(p1, p2, lines)
+		nearest = rayTraceLinesNearest(p1, p2, array)
+		if nearest != expected:
+			print "FAIL rayTraceLinesNearest", (p1, p2), lines, nearest, "expected", expected
+			failures += 1
+		if expected is not None:
+			hits += 1
+		if rayTraceLines(p1, p2, array) != rayTraceWorld(p1, p2, lines):
+			print "FAIL rayTraceLines", (p1, p2), lines
+			failures += 1
+	print "rays", rays, "hit something", hits
+	return failures
+
+
+if __name__ == "__main__":
+	pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+	seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+	failures = check(pairs, seed) + checkRayTraces(pairs / 4, seed)
+	print "failures", failures
+	sys.exit(1 if failures > 0 else 0)
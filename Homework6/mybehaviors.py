@@ -484,7 +484,7 @@ class MyRetreat(BTNode):
 	def execute(self, delta = 0):
 		currLoc = self.agent.getLocation()
 		dest = self.agent.moveTarget
-		if dest is not None:
+		if dest is not None and self.agent.world.background is not None:
 			pygame.draw.line(self.agent.world.background, (255, 165, 0), currLoc, self.agent.getMoveTarget(), 3)
 
 		BTNode.execute(self, delta)
@@ -513,7 +513,7 @@ class MyChaseHero(BTNode):
 	def execute(self, delta = 0):
 		currLoc = self.agent.getLocation()
 		dest = self.agent.moveTarget
-		if dest is not None:
+		if dest is not None and self.agent.world.background is not None:
 			pygame.draw.circle(self.agent.world.background, (0, 255, 0), (int(currLoc[0]), int(currLoc[1])), int(BIGBULLETRANGE), 3)
 			pygame.draw.line(self.agent.world.background, (0, 255, 0), currLoc, dest, 3)
 
@@ -586,25 +586,16 @@ def circleStrafe(agent, target, offset):
 	theta = math.atan2(currLoc[1] - targetLoc[1], currLoc[0] - targetLoc[0]) + offset
 	dest = (targetLoc[0] + BIGBULLETRANGE * math.cos(theta), targetLoc[1] + BIGBULLETRANGE * math.sin(theta))
 
-	# Ray trace to make sure you don't collide with anything. If you do, change directions
-	theta2 = math.atan2(currLoc[1] - dest[1], currLoc[0] - dest[0])
-	left = theta2 + math.pi / 2
-	right = theta2 - math.pi / 2
-	radius = agent.getMaxRadius()
-	leftPoint0 = (currLoc[0] + radius * math.cos(left), currLoc[1] + radius * math.sin(left))
-	leftPoint1 = (dest[0] + radius * math.cos(left), dest[1] + radius * math.sin(left))
-	rightPoint0 = (currLoc[0] + radius * math.cos(right), currLoc[1] + radius * math.sin(right))
-	rightPoint1 = (dest[0] + radius * math.cos(right), dest[1] + radius * math.sin(right))
-
-	lines = agent.world.getLines()
-	if rayTraceWorld(currLoc, dest, lines) is not None or rayTraceWorld(leftPoint0, leftPoint1, lines) is not None or rayTraceWorld(rightPoint0, rightPoint1, lines) is not None:
+	# Make sure you don't collide with anything. If you do, change directions
+	if not agent.world.capsuleClear(currLoc, dest, agent.getMaxRadius(), True):
 		offset *= -1
 		theta += 2 * offset
 		dest = (targetLoc[0] + BIGBULLETRANGE * math.cos(theta), targetLoc[1] + BIGBULLETRANGE * math.sin(theta))
 
 	agent.navigateTo(dest)
-	pygame.draw.circle(agent.world.background, (255, 0, 0), (int(targetLoc[0]), int(targetLoc[1])), int(BIGBULLETRANGE), 3)
-	pygame.draw.line(agent.world.background, (0, 255, 0), currLoc, dest, 3)
+	if agent.world.background is not None:
+		pygame.draw.circle(agent.world.background, (255, 0, 0), (int(targetLoc[0]), int(targetLoc[1])), int(BIGBULLETRANGE), 3)
+		pygame.draw.line(agent.world.background, (0, 255, 0), currLoc, dest, 3)
 
 	return dest, offset
 
@@ -628,4 +619,5 @@ def shootAtTarget(agent, target):
 		agent.turnToFace(target)
 		agent.shoot()
 
-		pygame.draw.line(agent.world.background, (255, 0, 0), currLoc, target, 3)
+		if agent.world.background is not None:
+			pygame.draw.line(agent.world.background, (255, 0, 0), currLoc, target, 3)
@@ -30,14 +30,18 @@ from WanderingMinion import *
 from clonenav import *
 
 if len(sys.argv) < 3:
-	print "Usage: python " + sys.argv[0] + " classname1 classname2"
+	print "Usage: python " + sys.argv[0] + " classname1 classname2 [headless] [profile]"
 	print "classname1 and classname2 must be in files with the same located in this directory."
+	print "headless runs the match without a window, as fast as possible."
+	print "profile times every part of every tick and prints the times when the match ends (or when 'p' is pressed)."
 	exit(1)
 
 module1 = __import__(sys.argv[1])
 module2 = __import__(sys.argv[2])
 class1 = getattr(module1, sys.argv[1])
 class2 = getattr(module2, sys.argv[2])
+headless = "headless" in sys.argv[3:]
+profile = "profile" in sys.argv[3:]
 
 ############################
 ### How to use this file
@@ -45,12 +49,17 @@ class2 = getattr(module2, sys.argv[2])
 ### Use this file to conduct a competition with other agents.
 ### Step 1: Give your MyHero class an unique name, e.g., MarkHero. Change the file name to match the class name exactly.
 ### Step 2: python runherocompetition.py classname1 classname2
+### Add "headless" as a third argument to run without a window (e.g., on a machine with no display).
+### Add "profile" to see where the time in each tick goes.
 
 ############################
 ### SET UP WORLD
 
 dims = (1200, 1200)
 
+# Headless matches that haven't been decided after this many ticks are called a draw
+MAXTICKS = 36000
+
 obstacles = [[(250, 150), (600, 200), (550, 350), (260, 390)],
 			 [(800, 200), (1040, 140), (1050, 160), (1025, 500), (1000, 500), (810, 310)]]
 
@@ -95,7 +104,9 @@ class MyAlienHero(class2):
 
 ########################
 
-world = MOBAWorld(SEED, dims, dims, 0, 60)
+world = MOBAWorld(SEED, dims, dims, 0, 60, headless)
+if profile:
+	world.enableProfiling()
 agent = GhostAgent(ELITE, (600, 500), 0, SPEED, world)
 #agent = Hero((600, 500), 0, world, ELITE)
 world.setPlayerAgent(agent)
@@ -134,5 +145,9 @@ hero1.start()
 hero2.start()
 
 
-
-world.run()
+if headless:
+	world.runUntil(lambda w: w.getWinner() is not None, MAXTICKS)
+	print "Winner", world.getWinner(), "after", world.ticks, "ticks"
+	print "Score", world.score
+else:
+	world.run()
@@ -0,0 +1,112 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import os, hashlib, inspect, cPickle, numpy
+
+#######################################
+### NAVIGATION CACHE
+###
+### Path networks and shortest-path tables depend only on the map, so they are saved under NAVCACHEDIR and loaded again on later runs instead of being rebuilt.
+### Each entry lives in its own directory named by a hash of everything it was built from. Set NAVCACHEDIR to None to always rebuild.
+### This file is shared by the homeworks: each core.py imports it from the directory above its own.
+
+### Where cache entries are saved, relative to this file
+NAVCACHEDIR = "navcache"
+
+### Part of every cache key. Bump it when something a path network depends on changes in a way the sources in the key don't show.
+NAVCACHEVERSION = 1
+
+### The framework files, next to the code that builds something, that go into its cache key along with that code
+NAVCACHESOURCES = ("core.py", "utils.py", "constants.py", "mynavigatorhelpers.py")
+
+### Returns a hex digest of the given values, used to name cache entries
+def navigationCacheKey(*parts):
+	return hashlib.sha1(repr((NAVCACHEVERSION,) + parts)).hexdigest()
+
+### Returns the text of the file that defines fn, followed by the text of each of NAVCACHESOURCES that is in the same directory,
+### so that editing the code that builds something, or the helpers it calls, changes its cache key
+def sourceOf(fn):
+	filename = inspect.getsourcefile(fn)
+	sources = []
+	for f in [filename] + [os.path.join(os.path.dirname(filename), name) for name in NAVCACHESOURCES]:
+		if os.path.exists(f):
+			with open(f) as source:
+				sources.append(source.read())
+	return sources
+
+### Returns the directory for the cache entry with the given key, making it if needed, or None if caching is turned off or the directory can't be made
+def navigationCacheDir(key):
+	if NAVCACHEDIR is None:
+		return None
+	directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), NAVCACHEDIR, key)
+	if not os.path.isdir(directory):
+		try:
+			os.makedirs(directory)
+		except OSError:
+			return None
+	return directory
+
+### Calls write(f) on a temporary file and moves it to filename once it is complete, so a run that dies part way through never leaves a broken cache entry
+def saveAtomically(filename, write):
+	temp = "%s.%d.tmp" % (filename, os.getpid())
+	try:
+		with open(temp, "wb") as f:
+			write(f)
+		os.rename(temp, filename)
+	except (IOError, OSError):
+		if os.path.exists(temp):
+			os.remove(temp)
+
+### Returns build(world, agent), e.g. myCreatePathNetwork's (pathnodes, pathnetwork, navmesh), loading it from the cache if it has been built before.
+### The key is the obstacle polygons, the world dimensions, the agent's radius, and the sources of build and the framework files next to it (see sourceOf).
+def cachedPathNetwork(world, agent, build):
+	radius = None
+	if agent is not None:
+		radius = agent.getMaxRadius()
+	obstacles = [o.getPoints() for o in (world.getObstacles() or [])]
+	directory = navigationCacheDir(navigationCacheKey(obstacles, world.getDimensions(), radius, sourceOf(build)))
+	if directory is None:
+		return build(world, agent)
+	filename = os.path.join(directory, "pathnetwork.pkl")
+	if os.path.exists(filename):
+		# Anything can go wrong unpickling a damaged or out of date file, and then it is simply rebuilt
+		try:
+			with open(filename, "rb") as f:
+				return cPickle.load(f)
+		except Exception:
+			pass
+	result = build(world, agent)
+	saveAtomically(filename, lambda f: cPickle.dump(result, f, cPickle.HIGHEST_PROTOCOL))
+	return result
+
+### Returns build(), a tuple of numpy arrays, one for each of names, loading them from the cache entry with the given key if they have been built before.
+### Loaded arrays are memory-mapped read-only, so they must not be changed.
+def cachedArrays(key, names, build):
+	directory = navigationCacheDir(key)
+	if directory is None:
+		return build()
+	filenames = [os.path.join(directory, name + ".npy") for name in names]
+	if all(os.path.exists(f) for f in filenames):
+		try:
+			return tuple(numpy.load(f, mmap_mode = 'r') for f in filenames)
+		except Exception:
+			pass
+	arrays = build()
+	for filename, array in zip(filenames, arrays):
+		saveAtomically(filename, lambda f: numpy.save(f, array))
+	return arrays